@@ -0,0 +1,214 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse
+from django.urls import URLPattern
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.authentication import (
+    TokenAuthentication,
+    get_authorization_header
+)
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from api.metrics import serialization_timer
+
+
+class Delegate(Exception):
+    """Запрос нужно обработать синхронным представлением DRF."""
+
+
+async def to_list(objects):
+    """Загружает queryset асинхронным ORM, списки возвращает как есть."""
+    if isinstance(objects, list):
+        return objects
+    return [obj async for obj in objects]
+
+
+async def authenticate(request):
+    """
+    Асинхронный аналог TokenAuthentication.
+
+    Возвращает пару (пользователь, токен) по заголовку Authorization или
+    анонимного пользователя без заголовка. Неверный токен и другие
+    классы аутентификации обрабатывает DRF: вызывается Delegate.
+    """
+    for authenticator in request.authenticators:
+        if not isinstance(authenticator, TokenAuthentication):
+            raise Delegate
+    header = get_authorization_header(request).split()
+    if not request.authenticators or not header or (
+        header[0].lower() != TokenAuthentication.keyword.lower().encode()
+    ):
+        return AnonymousUser(), None
+    if len(header) != 2:
+        raise Delegate
+    try:
+        key = header[1].decode()
+    except UnicodeError:
+        raise Delegate
+    token = await request.authenticators[0].get_model().objects.filter(
+        key=key
+    ).select_related('user').afirst()
+    if token is None or not token.user.is_active:
+        raise Delegate
+    return token.user, token
+
+
+def as_async_view(view):
+    """
+    Возвращает асинхронную обертку представления вьюсета DRF.
+
+    Если действие входит в async_actions вьюсета, запрос с ответом в JSON
+    обрабатывается его методом a<действие> на цикле событий:
+    аутентификация, права и content negotiation выполняются так же, как
+    в DRF. Остальные запросы, а также ошибки (неверный токен, нет прав,
+    404, ошибки валидации фильтров) передаются исходному представлению,
+    которое выполняется в потоке и формирует привычный ответ.
+    """
+    viewset = view.cls
+    sync_view = sync_to_async(view)
+
+    async def async_view(request, *args, **kwargs):
+        action = view.actions.get(request.method.lower())
+        if action not in viewset.async_actions:
+            return await sync_view(request, *args, **kwargs)
+        handler = getattr(viewset, f'a{action}')
+        self = viewset(**view.initkwargs)
+        self.action_map = view.actions
+        self.args = args
+        self.kwargs = kwargs
+        try:
+            return await self.adispatch(handler, request, *args, **kwargs)
+        except (Delegate, APIException, Http404):
+            return await sync_view(request, *args, **kwargs)
+
+    async_view.cls = viewset
+    async_view.initkwargs = view.initkwargs
+    async_view.actions = view.actions
+    return csrf_exempt(async_view)
+
+
+def async_urls(urlpatterns):
+    """
+    Заменяет в маршрутах роутера представления вьюсетов, у которых есть
+    асинхронные действия (async_actions), на обертки as_async_view.
+    """
+    result = []
+    for pattern in urlpatterns:
+        view = getattr(pattern, 'callback', None)
+        actions = getattr(view, 'actions', None) or {}
+        async_actions = getattr(getattr(view, 'cls', None),
+                                'async_actions', ())
+        if set(actions.values()) & set(async_actions):
+            pattern = URLPattern(
+                pattern.pattern,
+                as_async_view(view),
+                pattern.default_args,
+                pattern.name,
+            )
+        result.append(pattern)
+    return result
+
+
+class AsyncViewSetMixin:
+    """
+    Миксин вьюсета для асинхронных действий, которые вызывает
+    as_async_view.
+
+    Действия из async_actions реализуются методами a<действие>, которые
+    возвращают Response или HttpResponse. Данные читаются асинхронным
+    ORM, сериализаторы те же, что и у синхронных действий: все, что они
+    читают из базы, должно быть загружено заранее (select_related,
+    prefetch_related, ainitial).
+    """
+    async_actions = ()
+
+    async def adispatch(self, handler, request, *args, **kwargs):
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        renderer, media_type = self.perform_content_negotiation(request)
+        if renderer.format != 'json':
+            raise Delegate
+        request.accepted_renderer = renderer
+        request.accepted_media_type = media_type
+        request.user, request.auth = await authenticate(request)
+        self.check_permissions(request)
+        await self.ainitial(request)
+        response = await handler(self, request, *args, **kwargs)
+        response = self.finalize_response(request, response, *args, **kwargs)
+        if not hasattr(response, 'render'):
+            return response
+        # Готовый HttpResponse не рендерится повторно в потоке Django.
+        with serialization_timer():
+            response.render()
+        return HttpResponse(
+            response.content,
+            status=response.status_code,
+            headers=response.headers,
+        )
+
+    async def ainitial(self, request):
+        """Загружает данные, которые сериализаторы читают из базы."""
+
+    async def afilter_queryset(self, queryset):
+        """
+        Асинхронный filter_queryset.
+
+        Фильтры с методом afilter_queryset вызываются на цикле событий,
+        иначе все фильтры применяются в потоке: они могут обращаться
+        к базе (например, при проверке значений параметров).
+        """
+        backends = [backend() for backend in self.filter_backends]
+        if not all(
+            hasattr(backend, 'afilter_queryset') for backend in backends
+        ):
+            return await sync_to_async(self.filter_queryset)(queryset)
+        for backend in backends:
+            queryset = await backend.afilter_queryset(
+                self.request, queryset, self
+            )
+        return queryset
+
+    async def apaginate_queryset(self, queryset):
+        """
+        Асинхронный paginate_queryset. Пагинация без метода
+        apaginate_queryset обрабатывается синхронным представлением.
+        """
+        if self.paginator is None:
+            return None
+        if not hasattr(self.paginator, 'apaginate_queryset'):
+            raise Delegate
+        return await self.paginator.apaginate_queryset(
+            queryset, self.request, view=self
+        )
+
+    async def aget_object(self):
+        """Асинхронный get_object."""
+        queryset = await self.afilter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            ).afirst()
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        if obj is None:
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(await to_list(queryset), many=True)
+        return Response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        serializer = self.get_serializer(await self.aget_object())
+        return Response(serializer.data)
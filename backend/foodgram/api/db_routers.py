@@ -0,0 +1,54 @@
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS
+from foodgram.constants import REPLICA_DB_ALIAS
+
+# Маршрутизация запросов к базе в текущем контексте (запрос к API).
+current_routing = ContextVar('current_routing', default=None)
+
+
+class RequestRouting:
+    """
+    Состояние маршрутизации одного запроса к API.
+
+    use_replica выставляет ReplicaRoutingMiddleware. Первая запись
+    переключает запрос на основную базу до конца, а wrote сообщает
+    middleware, что пользователю нужно читать из основной базы и в
+    следующих запросах.
+    """
+
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+
+
+class ReplicaRouter:
+    """
+    Направляет чтение безопасных запросов к API в реплику.
+
+    Вне запроса к API (админка, команды, фоновые потоки) и после первой
+    записи в запросе чтение идет в основную базу. Запись и связи между
+    объектами всегда относятся к основной базе. Схема реплики совпадает
+    со схемой основной базы, поэтому миграции разрешены для обеих:
+    migrate без --database применяет их только к основной базе, а
+    тестовая база реплики создается со всеми таблицами.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = current_routing.get()
+        if routing is not None and routing.use_replica:
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        routing = current_routing.get()
+        if routing is not None:
+            routing.use_replica = False
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
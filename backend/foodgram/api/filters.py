@@ -1,7 +1,22 @@
+from django import forms
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Exists, F, FloatField, OuterRef
+from django.db.models.functions import Cast
 from django_filters.rest_framework import FilterSet, filters
-from rest_framework.filters import SearchFilter
+from foodgram.constants import INGREDIENTS_SEARCH_LIMIT, SEARCH_CONFIG
+from rest_framework.filters import (
+    BaseFilterBackend,
+    OrderingFilter,
+    SearchFilter
+)
 
-from recipes.models import Recipes, Tags
+from api.utils import get_tag_ids_by_slug
+from recipes.models import Recipes
+
+
+class MultipleSlugFilter(filters.Filter):
+    """Фильтр по нескольким значениям вида ?tags=a&tags=b."""
+    field_class = forms.MultipleChoiceField
 
 
 class RecipeFilter(FilterSet):
@@ -12,11 +27,7 @@ class RecipeFilter(FilterSet):
     - рецепт в корзине,
     - рецепт в изрбанном.
     """
-    tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tags.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug',
-    )
+    tags = MultipleSlugFilter(method='filter_tags')
     is_in_shopping_cart = filters.BooleanFilter(
         method='check_recipe_in_favorite_or_cart'
     )
@@ -24,6 +35,30 @@ class RecipeFilter(FilterSet):
         method='check_recipe_in_favorite_or_cart'
     )
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if 'tags' in self.data:
+            self.tag_ids = get_tag_ids_by_slug()
+            self.filters['tags'].extra['choices'] = [
+                (slug, slug) for slug in self.tag_ids
+            ]
+
+    def filter_tags(self, queryset, name, value):
+        """
+        Оставляет рецепты хотя бы с одним из выбранных тегов.
+
+        Использует подзапрос EXISTS к таблице связей рецептов и тегов,
+        поэтому рецепты не дублируются и DISTINCT не нужен.
+        """
+        return queryset.filter(
+            Exists(
+                Recipes.tags.through.objects.filter(
+                    recipes_id=OuterRef('pk'),
+                    tags_id__in=[self.tag_ids[slug] for slug in value],
+                )
+            )
+        )
+
     def check_recipe_in_favorite_or_cart(self, queryset, name, value):
         """
         - name: название поля ('is_in_shopping_cart' или 'is_favorited'),
@@ -54,5 +89,98 @@ class RecipeFilter(FilterSet):
 
 
 class IngredientFilter(SearchFilter):
-    """Фильтр для ингредиентов по имени."""
+    """
+    Фильтр для подсказок ингредиентов по имени.
+
+    Сначала возвращает ингредиенты, название которых начинается с введенной
+    строки, затем дополняет выдачу названиями, содержащими ее. Размер
+    выдачи ограничен INGREDIENTS_SEARCH_LIMIT.
+    """
     search_param = 'name'
+
+    def filter_queryset(self, request, queryset, view):
+        name = self.get_name(request, view)
+        if not name:
+            return queryset
+        ingredients = list(self.get_prefix_matches(queryset, name))
+        if len(ingredients) < INGREDIENTS_SEARCH_LIMIT:
+            ingredients += self.get_substring_matches(
+                queryset, name, INGREDIENTS_SEARCH_LIMIT - len(ingredients)
+            )
+        return ingredients
+
+    async def afilter_queryset(self, request, queryset, view):
+        """Асинхронный вариант filter_queryset."""
+        name = self.get_name(request, view)
+        if not name:
+            return queryset
+        ingredients = [
+            ingredient async for ingredient in
+            self.get_prefix_matches(queryset, name)
+        ]
+        if len(ingredients) < INGREDIENTS_SEARCH_LIMIT:
+            ingredients += [
+                ingredient async for ingredient in
+                self.get_substring_matches(
+                    queryset, name,
+                    INGREDIENTS_SEARCH_LIMIT - len(ingredients),
+                )
+            ]
+        return ingredients
+
+    def get_name(self, request, view):
+        if getattr(view, 'action', None) != 'list':
+            return ''
+        return request.query_params.get(self.search_param, '').strip()
+
+    def get_prefix_matches(self, queryset, name):
+        return queryset.filter(name__istartswith=name).order_by(
+            'name'
+        )[:INGREDIENTS_SEARCH_LIMIT]
+
+    def get_substring_matches(self, queryset, name, limit):
+        return queryset.filter(name__icontains=name).exclude(
+            name__istartswith=name
+        ).order_by('name')[:limit]
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """
+    Сортировка рецептов по популярности: ?ordering=-favorites_count.
+
+    К выбранной сортировке добавляется id, чтобы порядок рецептов
+    с одинаковыми значениями был стабильным между страницами.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and 'id' not in ordering:
+            ordering = [*ordering, 'id']
+        return ordering
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """
+    Полнотекстовый поиск рецептов по параметру ?search=.
+
+    Ищет по названию, описанию и ингредиентам рецепта с учетом русской
+    морфологии. Если не задана сортировка ?ordering=, результаты
+    упорядочиваются по релевантности.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        search = request.query_params.get(self.search_param, '').strip()
+        if not search:
+            return queryset
+        query = SearchQuery(
+            search, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        queryset = queryset.filter(search_vector=query)
+        if request.query_params.get(RecipeOrderingFilter.ordering_param):
+            return queryset
+        # ts_rank возвращает real, приведение к double precision нужно,
+        # чтобы ранг из курсора пагинации точно сравнивался с рангом в базе.
+        return queryset.annotate(
+            rank=Cast(SearchRank(F('search_vector'), query), FloatField())
+        ).order_by('-rank', 'id')
@@ -0,0 +1,425 @@
+import base64
+import io
+import json
+import math
+import multiprocessing
+import random
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Ingredients, Recipes, ShoppingCart, Tags
+from users.models import Subscribes, User
+
+SCENARIOS = (
+    'recipes_list',
+    'recipes_list_anonymous',
+    'recipes_list_tags',
+    'recipes_list_favorited',
+    'recipes_search',
+    'recipe_detail',
+    'recipe_detail_anonymous',
+    'subscriptions',
+    'shopping_cart_download',
+    'ingredient_search',
+    'tags_list',
+    'ingredients_list',
+    'recipe_create',
+    'recipe_update',
+)
+SEARCH_WORDS = ('суп', 'салат', 'курица', 'пирог', 'грибы', 'сыр')
+# Количество выбранных тегов в сценарии recipes_list_tags по умолчанию.
+TAGS_COUNTS = (1, 3, 10)
+# Начало названия рецептов, которые создаются во время замера.
+RECIPE_NAME = 'Бенчмарк'
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def load_data():
+    """Загружает идентификаторы объектов, общие для всех исполнителей."""
+    return {
+        'recipe_ids': list(Recipes.objects.values_list('pk', flat=True)),
+        'tag_ids': list(Tags.objects.values_list('pk', flat=True)),
+        'tag_slugs': list(Tags.objects.values_list('slug', flat=True)),
+        'ingredient_ids': list(
+            Ingredients.objects.values_list('pk', flat=True)[:1000]
+        ),
+        'ingredient_names': list(
+            Ingredients.objects.values_list('name', flat=True)[:1000]
+        ),
+    }
+
+
+def encode_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), 'green').save(buffer, 'PNG')
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+class BenchmarkWorker:
+    """
+    Выполняет запросы одного сценария от имени одного пользователя.
+
+    Запросы проходят весь стек Django в текущем процессе через тестовый
+    клиент DRF. Для каждого запроса фиксируются время, количество
+    SQL-запросов и статус ответа.
+    """
+
+    def __init__(self, user_id, seed, data):
+        self.random = random.Random(seed)
+        self.user_id = user_id
+        for name, value in data.items():
+            setattr(self, name, value)
+        self.image = encode_image()
+        self.own_recipe_id = None
+        self.setup()
+
+    def setup(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.authenticated_client = APIClient(SERVER_NAME='localhost')
+        self.authenticated_client.force_authenticate(
+            User.objects.get(pk=self.user_id)
+        )
+
+    def request(self, method, url, data=None, anonymous=False):
+        client = self.client if anonymous else self.authenticated_client
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = getattr(client, method)(url, data, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            latency = time.perf_counter() - start
+        return latency, len(context.captured_queries), response.status_code
+
+    def create_recipe(self):
+        response = self.authenticated_client.post(
+            '/api/recipes/', self.recipe_payload(), format='json'
+        )
+        return response.data['id']
+
+    def recipe_payload(self):
+        return {
+            'name': f'{RECIPE_NAME} {self.random.choice(SEARCH_WORDS)}',
+            'text': ' '.join(self.random.choices(SEARCH_WORDS, k=20)),
+            'cooking_time': self.random.randint(5, 120),
+            'image': self.image,
+            'tags': self.random.sample(
+                self.tag_ids, min(2, len(self.tag_ids))
+            ),
+            'ingredients': [
+                {'id': ingredient_id, 'amount': self.random.randint(1, 500)}
+                for ingredient_id in self.random.sample(
+                    self.ingredient_ids, min(8, len(self.ingredient_ids))
+                )
+            ],
+        }
+
+    def recipes_list(self):
+        return self.request('get', '/api/recipes/')
+
+    def recipes_list_anonymous(self):
+        page = self.random.randint(1, 5)
+        return self.request(
+            'get', f'/api/recipes/?page={page}', anonymous=True
+        )
+
+    def recipes_list_tags(self):
+        tags = '&'.join(
+            f'tags={slug}' for slug in self.random.sample(
+                self.tag_slugs, min(self.tags_count, len(self.tag_slugs))
+            )
+        )
+        return self.request('get', f'/api/recipes/?{tags}')
+
+    def recipes_list_favorited(self):
+        return self.request('get', '/api/recipes/?is_favorited=1')
+
+    def recipes_search(self):
+        word = self.random.choice(SEARCH_WORDS)
+        return self.request('get', f'/api/recipes/?search={word}')
+
+    def recipe_detail(self):
+        recipe_id = self.random.choice(self.recipe_ids)
+        return self.request('get', f'/api/recipes/{recipe_id}/')
+
+    def recipe_detail_anonymous(self):
+        recipe_id = self.random.choice(self.recipe_ids[:100])
+        return self.request(
+            'get', f'/api/recipes/{recipe_id}/', anonymous=True
+        )
+
+    def subscriptions(self):
+        return self.request(
+            'get', '/api/users/subscriptions/?recipes_limit=3'
+        )
+
+    def shopping_cart_download(self):
+        return self.request('get', '/api/recipes/download_shopping_cart/')
+
+    def ingredient_search(self):
+        name = self.random.choice(self.ingredient_names)[:3]
+        return self.request('get', f'/api/ingredients/?name={name}')
+
+    def tags_list(self):
+        return self.request('get', '/api/tags/')
+
+    def ingredients_list(self):
+        return self.request('get', '/api/ingredients/')
+
+    def recipe_create(self):
+        return self.request('post', '/api/recipes/', self.recipe_payload())
+
+    def recipe_update(self):
+        if self.own_recipe_id is None:
+            self.own_recipe_id = self.create_recipe()
+        return self.request(
+            'patch',
+            f'/api/recipes/{self.own_recipe_id}/',
+            self.recipe_payload(),
+        )
+
+
+class HttpBenchmarkWorker(BenchmarkWorker):
+    """
+    Выполняет запросы сценария к запущенному серверу по HTTP.
+
+    Каждый исполнитель держит свое keep-alive соединение, поэтому число
+    исполнителей равно числу одновременных соединений. Количество
+    SQL-запросов берется из заголовка Server-Timing ответа.
+    """
+
+    def __init__(self, user_id, seed, data, url, token):
+        self.url = url.rstrip('/')
+        self.token = token
+        super().__init__(user_id, seed, data)
+
+    def setup(self):
+        self.session = requests.Session()
+
+    def send(self, method, url, data=None, anonymous=False):
+        headers = {} if anonymous else {
+            'Authorization': f'Token {self.token}'
+        }
+        return self.session.request(
+            method, self.url + url, json=data, headers=headers
+        )
+
+    def request(self, method, url, data=None, anonymous=False):
+        start = time.perf_counter()
+        response = self.send(method, url, data, anonymous)
+        latency = time.perf_counter() - start
+        match = SERVER_TIMING_QUERIES.search(
+            response.headers.get('Server-Timing', '')
+        )
+        return (
+            latency, int(match[1]) if match else 0, response.status_code
+        )
+
+    def create_recipe(self):
+        return self.send(
+            'post', '/api/recipes/', self.recipe_payload()
+        ).json()['id']
+
+
+def run_worker(scenario, user_id, count, warmup, seed, data, url, token):
+    """Прогоняет сценарий и возвращает замеры и границы по времени."""
+    try:
+        if url:
+            worker = HttpBenchmarkWorker(user_id, seed, data, url, token)
+        else:
+            worker = BenchmarkWorker(user_id, seed, data)
+        run = getattr(worker, scenario)
+        for _ in range(warmup):
+            run()
+        start = time.time()
+        samples = [run() for _ in range(count)]
+        finish = time.time()
+        return start, finish, samples
+    finally:
+        connections.close_all()
+
+
+def percentile(values, percent):
+    """Процентиль по методу ближайшего ранга для отсортированного списка."""
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def summarize(results):
+    start = min(result[0] for result in results)
+    finish = max(result[1] for result in results)
+    samples = [sample for result in results for sample in result[2]]
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    queries = [sample[1] for sample in samples]
+    return {
+        'requests': len(samples),
+        'errors': sum(sample[2] >= 400 for sample in samples),
+        'throughput_rps': round(len(samples) / (finish - start), 2),
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 2),
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'max': round(latencies[-1], 2),
+        },
+        'queries_per_request': {
+            'mean': round(sum(queries) / len(queries), 2),
+            'max': max(queries),
+        },
+    }
+
+
+# Запуск команды: python manage.py benchmark_api --workers 4 --requests 200
+# [--processes] [--scenario recipes_list] [--output result.json]
+# [--url http://localhost:8000] [--tags 1 --tags 3 --tags 10]
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержки, пропускную способность и количество '
+        'SQL-запросов основных эндпоинтов API и выводит результат в JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=SCENARIOS,
+            help='Запустить только указанные сценарии (можно повторять).',
+        )
+        parser.add_argument(
+            '--tags',
+            action='append',
+            type=int,
+            help='Количество выбранных тегов в сценарии recipes_list_tags '
+                 '(можно повторять, по умолчанию 1, 3 и 10). Каждое '
+                 'значение замеряется отдельно.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Количество параллельных исполнителей.',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=100,
+            help='Количество запросов каждого исполнителя на сценарий.',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Количество прогревочных запросов без учета в замерах.',
+        )
+        parser.add_argument(
+            '--processes',
+            action='store_true',
+            help='Запускать исполнителей в отдельных процессах, '
+                 'а не в потоках.',
+        )
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Префикс пользователей, созданных generate_dataset.',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--label',
+            help='Метка прогона, например хэш коммита.',
+        )
+        parser.add_argument('--output', help='Файл для результата в JSON.')
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера, например '
+                 'http://localhost:8000. По умолчанию запросы выполняются '
+                 'в текущем процессе через тестовый клиент.',
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        user_ids = list(
+            User.objects.filter(username__startswith=options['prefix'])
+            .order_by('pk').values_list('pk', flat=True)[:workers]
+        )
+        if not user_ids:
+            raise CommandError(
+                'Нет пользователей с префиксом '
+                f'{options["prefix"]}, запустите generate_dataset.'
+            )
+
+        data = load_data()
+        tokens = {}
+        if options['url']:
+            tokens = {
+                user_id: Token.objects.get_or_create(user_id=user_id)[0].key
+                for user_id in user_ids
+            }
+
+        report = {
+            'label': options['label'],
+            'started_at': timezone.now().isoformat(),
+            'target': options['url'] or 'in-process',
+            'workers': workers,
+            'mode': 'processes' if options['processes'] else 'threads',
+            'requests_per_worker': options['requests'],
+            'dataset': {
+                model.__name__: model.objects.count()
+                for model in (
+                    User, Recipes, Ingredients, Favorite, ShoppingCart,
+                    Subscribes,
+                )
+            },
+            'scenarios': {},
+        }
+        if options['processes']:
+            # Дочерние процессы не должны наследовать открытые соединения.
+            connections.close_all()
+            executor = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context('fork')
+            )
+        else:
+            executor = ThreadPoolExecutor(workers)
+        runs = []
+        for scenario in options['scenario'] or SCENARIOS:
+            if scenario == 'recipes_list_tags':
+                runs += [
+                    (scenario, f'{scenario}_{count}', count)
+                    for count in options['tags'] or TAGS_COUNTS
+                ]
+            else:
+                runs.append((scenario, scenario, None))
+        with executor:
+            for scenario, name, tags_count in runs:
+                self.stderr.write(f'Сценарий {name}...')
+                run_data = {**data, 'tags_count': tags_count}
+                worker_user_ids = [
+                    user_ids[number % len(user_ids)]
+                    for number in range(workers)
+                ]
+                results = list(executor.map(
+                    run_worker,
+                    [scenario] * workers,
+                    worker_user_ids,
+                    [options['requests']] * workers,
+                    [options['warmup']] * workers,
+                    [options['seed'] + number for number in range(workers)],
+                    [run_data] * workers,
+                    [options['url']] * workers,
+                    [tokens.get(user_id) for user_id in worker_user_ids],
+                ))
+                report['scenarios'][name] = summarize(results)
+        # Рецепты, созданные во время замера, удаляются одним запросом.
+        Recipes.objects.filter(
+            author_id__in=user_ids, name__startswith=RECIPE_NAME
+        ).delete()
+
+        content = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(content)
+        else:
+            self.stdout.write(content)
@@ -0,0 +1,111 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import Recipes, Tags
+from users.models import User
+
+# Эндпоинты, запросы которых анализируются. В адресах подставляются
+# id первого рецепта, слаг первого тега и параметры по умолчанию.
+ENDPOINTS = (
+    '/api/recipes/',
+    '/api/recipes/?tags={tag}',
+    '/api/recipes/?is_favorited=1',
+    '/api/recipes/?is_in_shopping_cart=0',
+    '/api/recipes/?author={author}',
+    '/api/recipes/?ordering=-favorites_count',
+    '/api/recipes/?search=суп',
+    '/api/recipes/?cursor=',
+    '/api/recipes/{recipe}/',
+    '/api/recipes/download_shopping_cart/',
+    '/api/users/',
+    '/api/users/subscriptions/?recipes_limit=3',
+    '/api/ingredients/?name=мя',
+    '/api/tags/',
+)
+
+# Курсоры на стороне сервера (QuerySet.iterator) оборачивают SELECT в
+# DECLARE ... CURSOR; для EXPLAIN нужен сам запрос.
+DECLARE_CURSOR = re.compile(r'^DECLARE .+? CURSOR .*?FOR ', re.S)
+
+
+# Запуск команды: python manage.py explain_api --user admin@example.com
+class Command(BaseCommand):
+    help = (
+        'Выполняет основные GET-запросы API и выводит планы выполнения '
+        '(EXPLAIN) всех SQL-запросов, чтобы отслеживать работу индексов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Email пользователя, от имени которого выполняются запросы.',
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Выполнить EXPLAIN ANALYZE с фактическим временем.',
+        )
+        parser.add_argument(
+            '--endpoint',
+            action='append',
+            help='Проверить только указанные адреса (можно повторять).',
+        )
+
+    def get_client(self, email):
+        client = APIClient(SERVER_NAME='localhost')
+        if email:
+            user = User.objects.filter(email=email).first()
+            if user is None:
+                raise CommandError(f'Пользователь {email} не найден.')
+            client.force_authenticate(user)
+        return client
+
+    def capture(self, client, url):
+        """Выполняет запрос и возвращает выполненные SQL-запросы."""
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        queries = (
+            DECLARE_CURSOR.sub('', query['sql'])
+            for query in context.captured_queries
+        )
+        return response.status_code, [
+            sql for sql in queries if sql.lstrip().upper().startswith('SELECT')
+        ]
+
+    def explain(self, sql, analyze):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {"ANALYZE " if analyze else ""}{sql}')
+            return [row[0] for row in cursor.fetchall()]
+
+    def handle(self, *args, **options):
+        recipe = Recipes.objects.only('id', 'author_id').first()
+        tag = Tags.objects.only('slug').first()
+        params = {
+            'recipe': recipe.pk if recipe else 0,
+            'author': recipe.author_id if recipe else 0,
+            'tag': tag.slug if tag else '',
+        }
+        client = self.get_client(options['user'])
+
+        seq_scans = 0
+        for endpoint in options['endpoint'] or ENDPOINTS:
+            url = endpoint.format(**params)
+            status_code, queries = self.capture(client, url)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'GET {url} -> {status_code}, запросов: {len(queries)}'
+            ))
+            for number, sql in enumerate(queries, 1):
+                self.stdout.write(f'[{number}] {sql}')
+                for line in self.explain(sql, options['analyze']):
+                    if 'Seq Scan' in line:
+                        seq_scans += 1
+                        line = self.style.WARNING(line)
+                    self.stdout.write(f'    {line}')
+            self.stdout.write('')
+        self.stdout.write(f'Последовательных сканирований: {seq_scans}.')
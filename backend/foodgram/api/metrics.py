@@ -0,0 +1,305 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from foodgram.constants import (
+    METRICS_DURATION_BUCKETS,
+    METRICS_QUERIES_BUCKETS
+)
+
+# Метрики запроса, который обрабатывается в текущем контексте.
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Метрики одного запроса к API.
+
+    Экземпляр вызывается из execute_wrapper соединений с базой и считает
+    количество SQL-запросов и время их выполнения. Время сериализации
+    складывается из to_representation верхнего уровня (без времени
+    запросов внутри него) и рендеринга ответа.
+    """
+
+    def __init__(self, collect_sql=False):
+        self.view = 'unresolved'
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.total_time = 0.0
+        self.sql = [] if collect_sql else None
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            if self.sql is not None:
+                self.sql.append(sql)
+
+    def server_timing(self):
+        """Возвращает значение заголовка Server-Timing."""
+        return ', '.join((
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serialize_time * 1000:.2f}',
+            f'total;dur={self.total_time * 1000:.2f}',
+        ))
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """
+    Передает SQL-запрос в метрики запроса текущего контекста.
+
+    Контекст переходит в потоки sync_to_async, поэтому запросы
+    асинхронных представлений учитываются так же, как синхронных.
+    """
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_execute_wrapper(connection, **kwargs):
+    """Подключает execute_wrapper к соединению с базой один раз."""
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+def count_connection(connection, **kwargs):
+    """Учитывает открытие соединения с базой или получение его из пула."""
+    registry.count_connection(connection.alias)
+
+
+def get_pool_stats():
+    """
+    Возвращает статистику пулов соединений psycopg по алиасам баз.
+
+    Базы без пула (OPTIONS['pool']) пропускаются.
+    """
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is not None:
+            stats[alias] = pool.get_stats()
+    return stats
+
+
+@contextmanager
+def serialization_timer():
+    """
+    Учитывает время сериализации в метриках текущего запроса.
+
+    Вложенные сериализаторы не измеряются повторно, время SQL-запросов,
+    выполненных во время сериализации, вычитается.
+    """
+    metrics = current_metrics.get()
+    if metrics is None or metrics.serializing:
+        yield
+        return
+    metrics.serializing = True
+    db_time = metrics.db_time
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serialize_time += (
+            time.perf_counter() - start - (metrics.db_time - db_time)
+        )
+        metrics.serializing = False
+
+
+class Histogram:
+    """Гистограмма с накопительными корзинами в формате Prometheus."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Агрегированные метрики API в памяти процесса.
+
+    Каждый процесс (воркер gunicorn) хранит собственные значения,
+    Prometheus собирает их при опросе конкретного процесса.
+    """
+    HISTOGRAMS = (
+        (
+            'foodgram_api_request_duration_seconds',
+            'Полное время обработки запроса к API.',
+            METRICS_DURATION_BUCKETS,
+            'total_time',
+        ),
+        (
+            'foodgram_api_db_duration_seconds',
+            'Время выполнения SQL-запросов за запрос к API.',
+            METRICS_DURATION_BUCKETS,
+            'db_time',
+        ),
+        (
+            'foodgram_api_serialization_duration_seconds',
+            'Время сериализации и рендеринга ответа API.',
+            METRICS_DURATION_BUCKETS,
+            'serialize_time',
+        ),
+        (
+            'foodgram_api_db_queries',
+            'Количество SQL-запросов за запрос к API.',
+            METRICS_QUERIES_BUCKETS,
+            'queries',
+        ),
+    )
+
+    # Метрики пула соединений: имя, тип, описание и значение из
+    # статистики psycopg_pool.
+    POOL_METRICS = (
+        (
+            'foodgram_db_pool_max_size',
+            'gauge',
+            'Максимальный размер пула соединений.',
+            lambda stats: stats['pool_max'],
+        ),
+        (
+            'foodgram_db_pool_size',
+            'gauge',
+            'Количество открытых соединений пула.',
+            lambda stats: stats['pool_size'],
+        ),
+        (
+            'foodgram_db_pool_in_use',
+            'gauge',
+            'Количество соединений пула, выданных запросам.',
+            lambda stats: stats['pool_size'] - stats['pool_available'],
+        ),
+        (
+            'foodgram_db_pool_waiting',
+            'gauge',
+            'Количество запросов, ожидающих свободного соединения.',
+            lambda stats: stats.get('requests_waiting', 0),
+        ),
+        (
+            'foodgram_db_pool_requests_total',
+            'counter',
+            'Количество запросов соединения из пула.',
+            lambda stats: stats.get('requests_num', 0),
+        ),
+        (
+            'foodgram_db_pool_requests_queued_total',
+            'counter',
+            'Количество запросов соединения, которые ждали в очереди.',
+            lambda stats: stats.get('requests_queued', 0),
+        ),
+        (
+            'foodgram_db_pool_wait_seconds_total',
+            'counter',
+            'Суммарное время ожидания соединения из пула.',
+            lambda stats: stats.get('requests_wait_ms', 0) / 1000,
+        ),
+        (
+            'foodgram_db_pool_timeouts_total',
+            'counter',
+            'Количество запросов, не дождавшихся соединения из пула.',
+            lambda stats: stats.get('requests_errors', 0),
+        ),
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.responses = {}
+        self.connections = {}
+
+    def count_connection(self, alias):
+        with self.lock:
+            self.connections[alias] = self.connections.get(alias, 0) + 1
+
+    def observe(self, metrics, status_code):
+        with self.lock:
+            for name, _, buckets, attr in self.HISTOGRAMS:
+                histogram = self.histograms.get((name, metrics.view))
+                if histogram is None:
+                    histogram = Histogram(buckets)
+                    self.histograms[(name, metrics.view)] = histogram
+                histogram.observe(getattr(metrics, attr))
+            key = (metrics.view, status_code)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def render(self):
+        """Возвращает метрики в текстовом формате Prometheus."""
+        lines = []
+        with self.lock:
+            for name, description, buckets, _ in self.HISTOGRAMS:
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, view), histogram in sorted(
+                    self.histograms.items()
+                ):
+                    if metric != name:
+                        continue
+                    label = f'view="{escape_label(view)}"'
+                    for bound, count in zip(buckets, histogram.counts):
+                        lines.append(
+                            f'{name}_bucket{{{label},le="{bound}"}} {count}'
+                        )
+                    lines.append(
+                        f'{name}_bucket{{{label},le="+Inf"}} '
+                        f'{histogram.count}'
+                    )
+                    lines.append(f'{name}_sum{{{label}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{label}}} {histogram.count}')
+            lines.append(
+                '# HELP foodgram_api_responses_total '
+                'Количество ответов API по представлениям и статусам.'
+            )
+            lines.append('# TYPE foodgram_api_responses_total counter')
+            for (view, status_code), count in sorted(self.responses.items()):
+                lines.append(
+                    'foodgram_api_responses_total{'
+                    f'view="{escape_label(view)}",status="{status_code}"'
+                    f'}} {count}'
+                )
+            lines.append(
+                '# HELP foodgram_db_connections_opened_total '
+                'Сколько раз соединение с базой открывалось '
+                'или бралось из пула.'
+            )
+            lines.append('# TYPE foodgram_db_connections_opened_total counter')
+            for alias, count in sorted(self.connections.items()):
+                lines.append(
+                    'foodgram_db_connections_opened_total{'
+                    f'database="{escape_label(alias)}"}} {count}'
+                )
+        pool_stats = get_pool_stats()
+        for name, metric_type, description, value in self.POOL_METRICS:
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for alias, stats in sorted(pool_stats.items()):
+                lines.append(
+                    f'{name}{{database="{escape_label(alias)}"}} '
+                    f'{value(stats)}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    """Экранирует значение метки Prometheus."""
+    return (
+        value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    )
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,239 @@
+import hashlib
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from foodgram.constants import (
+    READ_YOUR_WRITES_CACHE_PREFIX,
+    READ_YOUR_WRITES_COOKIE,
+    REPLICA_DB_ALIAS
+)
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import SAFE_METHODS
+
+from api.db_routers import RequestRouting, current_routing
+from api.metrics import (
+    RequestMetrics,
+    count_connection,
+    current_metrics,
+    install_execute_wrapper,
+    registry
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ApiMetricsMiddleware:
+    """
+    Собирает метрики запросов к API.
+
+    Для каждого запроса к /api/ считает количество SQL-запросов, время
+    базы, сериализации и полное время, добавляет их в заголовок
+    Server-Timing и в гистограммы по представлению и действию
+    (например, RecipesViewSet.list). При превышении порога
+    API_QUERY_COUNT_THRESHOLD в лог пишутся все SQL-запросы.
+    Запросы, выполненные при отдаче потокового ответа, не учитываются.
+
+    Работает и в синхронном, и в асинхронном режиме, поэтому под ASGI
+    не переводит асинхронные представления в поток. Метрики запроса
+    хранятся в contextvar, а SQL-запросы перехватывает execute_wrapper,
+    который подключается к каждому новому соединению с базой. Там же
+    считается, сколько раз соединения открывались или брались из пула.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.API_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = settings.API_QUERY_COUNT_THRESHOLD
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        connection_created.connect(
+            install_execute_wrapper, dispatch_uid='api_metrics'
+        )
+        connection_created.connect(
+            count_connection, dispatch_uid='api_metrics_connections'
+        )
+        for connection in connections.all(initialized_only=True):
+            install_execute_wrapper(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not request.path.startswith('/api/'):
+            return self.get_response(request)
+
+        metrics = RequestMetrics(collect_sql=bool(self.threshold))
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        if not request.path.startswith('/api/'):
+            return await self.get_response(request)
+
+        metrics = RequestMetrics(collect_sql=bool(self.threshold))
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    def finish(self, request, response, metrics, start):
+        """Дописывает метрики в ответ, гистограммы и лог."""
+        metrics.total_time = time.perf_counter() - start
+        response['Server-Timing'] = metrics.server_timing()
+        registry.observe(metrics, response.status_code)
+        if self.threshold and metrics.queries > self.threshold:
+            logger.warning(
+                '%s %s (%s): %d SQL-запросов при пороге %d.\n%s',
+                request.method,
+                request.get_full_path(),
+                metrics.view,
+                metrics.queries,
+                self.threshold,
+                '\n'.join(metrics.sql),
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return None
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is None:
+            metrics.view = view_func.__name__
+            return None
+        action = (getattr(view_func, 'actions', None) or {}).get(
+            request.method.lower(), request.method.lower()
+        )
+        metrics.view = f'{view_class.__name__}.{action}'
+        return None
+
+    def process_template_response(self, request, response):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return response
+        start = time.perf_counter()
+
+        def stop_timer(response):
+            metrics.serialize_time += time.perf_counter() - start
+
+        response.add_post_render_callback(stop_timer)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Выбирает базу для чтения в запросах к API.
+
+    Безопасные запросы (GET, HEAD, OPTIONS) читают из реплики, пока в
+    запросе ничего не записано (см. ReplicaRouter). После записи
+    пользователь DB_REPLICA_READ_YOUR_WRITES секунд читает из основной
+    базы, чтобы сразу видеть свои изменения несмотря на отставание
+    реплики. Для браузера это запоминается в cookie, для клиентов API —
+    меткой токена в кэше ответов. Метку должны видеть все воркеры,
+    поэтому кэш в памяти процесса не допускается.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if REPLICA_DB_ALIAS not in settings.DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.window = settings.DB_REPLICA_READ_YOUR_WRITES
+        self.cache = caches[settings.RESPONSE_CACHE_ALIAS]
+        if self.window and isinstance(self.cache, (LocMemCache, DummyCache)):
+            raise ImproperlyConfigured(
+                'Для реплики с DB_REPLICA_READ_YOUR_WRITES нужен общий для '
+                'воркеров кэш ответов: задайте RESPONSE_CACHE_BACKEND '
+                '(Redis, Memcached, файловый кэш).'
+            )
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not request.path.startswith('/api/'):
+            return self.get_response(request)
+
+        marker = self.get_marker_key(request)
+        routing = RequestRouting(
+            self.can_use_replica(request)
+            and not (marker and self.cache.get(marker))
+        )
+        token = current_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        if routing.wrote and self.window:
+            self.set_cookie(response)
+            if marker:
+                self.cache.set(marker, True, self.window)
+        return response
+
+    async def __acall__(self, request):
+        if not request.path.startswith('/api/'):
+            return await self.get_response(request)
+
+        marker = self.get_marker_key(request)
+        routing = RequestRouting(
+            self.can_use_replica(request)
+            and not (marker and await self.cache.aget(marker))
+        )
+        token = current_routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        if routing.wrote and self.window:
+            self.set_cookie(response)
+            if marker:
+                await self.cache.aset(marker, True, self.window)
+        return response
+
+    def can_use_replica(self, request):
+        return (
+            request.method in SAFE_METHODS
+            and READ_YOUR_WRITES_COOKIE not in request.COOKIES
+        )
+
+    def get_marker_key(self, request):
+        """Возвращает ключ кэша метки для токена из Authorization."""
+        header = request.META.get('HTTP_AUTHORIZATION', '').split()
+        if (
+            len(header) != 2
+            or header[0].lower() != TokenAuthentication.keyword.lower()
+        ):
+            return None
+        digest = hashlib.sha256(header[1].encode()).hexdigest()
+        return f'{READ_YOUR_WRITES_CACHE_PREFIX}:{digest}'
+
+    def set_cookie(self, response):
+        response.set_cookie(
+            READ_YOUR_WRITES_COOKIE,
+            '1',
+            max_age=self.window,
+            httponly=True,
+            samesite='Lax',
+        )
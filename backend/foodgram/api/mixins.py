@@ -1,32 +1,334 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, urlencode
+from foodgram.constants import RESPONSE_CACHE_LOCK_TIMEOUT
 from rest_framework import status
 from rest_framework.response import Response
 
+from api.async_views import to_list
+from api.metrics import serialization_timer
+from api.utils import change_counter, create_once
+from recipes.models import DataVersion, Recipes, ShoppingCart, ShoppingListItem
+
 
 class RecipeCreateDeleteMixin:
-    """Миксин реализует логику для добавления и удаления рецептов."""
+    """
+    Миксин реализует логику для добавления и удаления рецептов.
+
+    Добавление выполняется одним INSERT, повторная запись отклоняется
+    ограничением уникальности в базе (create_once), а счетчик и список
+    покупок меняются, только если строка действительно добавлена.
+    Удаление выполняется одним DELETE, результат определяется по
+    количеству удаленных строк. Поэтому одновременные запросы получают
+    предсказуемые ответы 201/400/204.
+    """
     def perform_action(self, request, pk, model, serializer_class):
         recipe = self.get_object()
         user = request.user
-        queryset = model.objects.filter(user=user, recipe=recipe)
-        exists = queryset.exists()
 
         if request.method == 'POST':
-            if exists:
-                return Response(
-                    {'errors': 'Рецепт уже существует.'},
-                    status=status.HTTP_400_BAD_REQUEST
+            with transaction.atomic():
+                if not create_once(model, user=user, recipe=recipe):
+                    return Response(
+                        {'errors': 'Рецепт уже существует.'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                change_counter(
+                    Recipes.objects.filter(pk=recipe.pk),
+                    model.counter_field,
+                    1,
                 )
-            model.objects.create(user=user, recipe=recipe)
+                if model is ShoppingCart:
+                    ShoppingListItem.objects.add_recipe(recipe, [user.pk])
             serializer = serializer_class(
                 recipe, context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         elif request.method == 'DELETE':
-            if not exists:
+            with transaction.atomic():
+                deleted, _ = model.objects.filter(
+                    user=user, recipe=recipe
+                ).delete()
+                if deleted:
+                    change_counter(
+                        Recipes.objects.filter(pk=recipe.pk),
+                        model.counter_field,
+                        -1,
+                    )
+                if deleted and model is ShoppingCart:
+                    ShoppingListItem.objects.remove_recipe(recipe, [user.pk])
+            if not deleted:
                 return Response(
                     {'errors': 'Рецепт не найден.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            queryset.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ReferenceDataCacheMixin:
+    """
+    Миксин отдает полный список справочника из кэша.
+
+    В кэше хранится готовый JSON, ключ и ETag включают версию набора
+    данных reference_name из DataVersion. Версия увеличивается сигналами
+    при изменении данных, поэтому устаревший ответ не будет отдан ни одним
+    процессом. Клиент с актуальным If-None-Match получает ответ 304.
+    """
+    reference_name = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params or request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+
+        version = DataVersion.objects.get_version(self.reference_name)
+        if self.is_not_modified(request, version):
+            return self.reference_response(HttpResponseNotModified(), version)
+        cache = caches[settings.REFERENCE_CACHE_ALIAS]
+        key = f'{self.reference_name}:{version}'
+        content = cache.get(key)
+        if content is None:
+            content = self.render_reference(
+                request, self.filter_queryset(self.get_queryset())
+            )
+            cache.set(key, content)
+        return self.reference_response(
+            HttpResponse(
+                content, content_type=request.accepted_renderer.media_type
+            ),
+            version,
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        """Асинхронный вариант list."""
+        if request.query_params:
+            return await super().alist(request, *args, **kwargs)
+
+        version = await DataVersion.objects.aget_version(self.reference_name)
+        if self.is_not_modified(request, version):
+            return self.reference_response(HttpResponseNotModified(), version)
+        cache = caches[settings.REFERENCE_CACHE_ALIAS]
+        key = f'{self.reference_name}:{version}'
+        content = await cache.aget(key)
+        if content is None:
+            content = self.render_reference(
+                request,
+                await to_list(self.filter_queryset(self.get_queryset())),
+            )
+            await cache.aset(key, content)
+        return self.reference_response(
+            HttpResponse(
+                content, content_type=request.accepted_renderer.media_type
+            ),
+            version,
+        )
+
+    def get_etag(self, version):
+        return f'"{self.reference_name}-{version}"'
+
+    def is_not_modified(self, request, version):
+        """Проверяет, что у клиента уже есть справочник версии version."""
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        return self.get_etag(version) in if_none_match or '*' in if_none_match
+
+    def render_reference(self, request, objects):
+        serializer = self.get_serializer(objects, many=True)
+        return request.accepted_renderer.render(serializer.data)
+
+    def reference_response(self, response, version):
+        response['ETag'] = self.get_etag(version)
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
+class RecipeResponseCacheMixin:
+    """
+    Миксин кэширует готовые ответы списка и рецепта для анонимных
+    пользователей.
+
+    Ответ списка хранится вместе с поколением списков рецептов, ответ
+    рецепта - с версией рецепта. Сигналы увеличивают их при изменении
+    рецепта, его тегов и ингредиентов или профиля автора, поэтому
+    проверка актуальности стоит одного запроса к базе. Пока один запрос
+    пересчитывает устаревший ответ, остальные получают прежний
+    (stale-while-revalidate) и не нагружают базу одновременно.
+    Списки кэшируются только для параметров cached_list_params.
+    """
+    cached_list_params = ('page', 'limit', 'tags', 'author')
+
+    def response_cache_allowed(self, request):
+        return (
+            not request.user.is_authenticated
+            and request.accepted_renderer.format == 'json'
+        )
+
+    def get_list_cache_key(self, request):
+        """Возвращает ключ кэша списка или None, если он не кэшируется."""
+        if (
+            not self.response_cache_allowed(request)
+            or set(request.query_params) - set(self.cached_list_params)
+        ):
+            return None
+        query = urlencode([
+            (name, value)
+            for name in sorted(request.query_params)
+            for value in sorted(set(request.query_params.getlist(name)))
+        ])
+        return f'recipes:list:{request.get_host()}?{query}'
+
+    def get_detail_cache_key(self, request, pk):
+        """Возвращает ключ кэша рецепта или None, если он не кэшируется."""
+        if (
+            not self.response_cache_allowed(request)
+            or request.query_params
+            or not pk.isdigit()
+        ):
+            return None
+        return f'recipes:detail:{request.get_host()}:{pk}'
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_list_cache_key(request)
+        if key is None:
+            return super().list(request, *args, **kwargs)
+        return self.get_cached_response(
+            request,
+            key,
+            DataVersion.objects.get_version('recipes'),
+            lambda: super(RecipeResponseCacheMixin, self).list(
+                request, *args, **kwargs
+            ),
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        """Асинхронный вариант list."""
+        key = self.get_list_cache_key(request)
+        if key is None:
+            return await super().alist(request, *args, **kwargs)
+        return await self.aget_cached_response(
+            request,
+            key,
+            await DataVersion.objects.aget_version('recipes'),
+            lambda: super(RecipeResponseCacheMixin, self).alist(
+                request, *args, **kwargs
+            ),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = str(kwargs.get(self.lookup_field, ''))
+        key = self.get_detail_cache_key(request, pk)
+        version = key and Recipes.objects.filter(pk=pk).values_list(
+            'version', flat=True
+        ).first()
+        if version is None:
+            return super().retrieve(request, *args, **kwargs)
+        return self.get_cached_response(
+            request,
+            key,
+            version,
+            lambda: super(RecipeResponseCacheMixin, self).retrieve(
+                request, *args, **kwargs
+            ),
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        """Асинхронный вариант retrieve."""
+        pk = str(kwargs.get(self.lookup_field, ''))
+        key = self.get_detail_cache_key(request, pk)
+        version = key and await Recipes.objects.filter(pk=pk).values_list(
+            'version', flat=True
+        ).afirst()
+        if version is None:
+            return await super().aretrieve(request, *args, **kwargs)
+        return await self.aget_cached_response(
+            request,
+            key,
+            version,
+            lambda: super(RecipeResponseCacheMixin, self).aretrieve(
+                request, *args, **kwargs
+            ),
+        )
+
+    def get_cached_response(self, request, key, version, get_response):
+        """
+        Возвращает ответ из кэша, если он построен для версии version,
+        иначе строит его через get_response и сохраняет.
+        """
+        cache = caches[settings.RESPONSE_CACHE_ALIAS]
+        key = hashlib.md5(key.encode()).hexdigest()
+        lock_key = f'{key}:lock'
+        entry = cache.get(key)
+        if entry is not None and entry[0] == version:
+            cache_status, content = 'HIT', entry[1]
+        elif entry is not None and not cache.add(
+            lock_key, True, RESPONSE_CACHE_LOCK_TIMEOUT
+        ):
+            cache_status, content = 'STALE', entry[1]
+        else:
+            try:
+                response = get_response()
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                content = self.render_cached_content(request, response)
+                cache.set(key, (version, content))
+            finally:
+                if entry is not None:
+                    cache.delete(lock_key)
+            cache_status = 'MISS'
+        return self.cached_response(request, content, cache_status)
+
+    async def aget_cached_response(self, request, key, version,
+                                   get_response):
+        """
+        Асинхронный вариант get_cached_response, get_response возвращает
+        корутину.
+        """
+        cache = caches[settings.RESPONSE_CACHE_ALIAS]
+        key = hashlib.md5(key.encode()).hexdigest()
+        lock_key = f'{key}:lock'
+        entry = await cache.aget(key)
+        if entry is not None and entry[0] == version:
+            cache_status, content = 'HIT', entry[1]
+        elif entry is not None and not await cache.aadd(
+            lock_key, True, RESPONSE_CACHE_LOCK_TIMEOUT
+        ):
+            cache_status, content = 'STALE', entry[1]
+        else:
+            try:
+                response = await get_response()
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                content = self.render_cached_content(request, response)
+                await cache.aset(key, (version, content))
+            finally:
+                if entry is not None:
+                    await cache.adelete(lock_key)
+            cache_status = 'MISS'
+        return self.cached_response(request, content, cache_status)
+
+    def render_cached_content(self, request, response):
+        return request.accepted_renderer.render(
+            response.data,
+            request.accepted_media_type,
+            self.get_renderer_context(),
+        )
+
+    def cached_response(self, request, content, cache_status):
+        response = HttpResponse(
+            content, content_type=request.accepted_renderer.media_type
+        )
+        response['X-Cache'] = cache_status
+        return response
+
+
+class SerializationMetricsMixin:
+    """
+    Миксин сериализатора учитывает время to_representation в метриках
+    текущего запроса к API (заголовок Server-Timing, гистограммы).
+    """
+    def to_representation(self, instance):
+        with serialization_timer():
+            return super().to_representation(instance)
@@ -1,8 +1,188 @@
-from rest_framework.pagination import PageNumberPagination
+import json
 
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
 from foodgram.constants import PAGE_SIZE
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    Cursor,
+    CursorPagination,
+    PageNumberPagination
+)
+
+from api.async_views import Delegate
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация без OFFSET и без запроса COUNT(*).
+
+    Курсор хранит значения всех полей сортировки последнего (для ссылки
+    previous — первого) объекта страницы, например (favorites_count, id)
+    при ?ordering=-favorites_count. Следующая страница выбирается
+    условием (favorites_count < c) OR (favorites_count = c AND id > i),
+    поэтому позиция не зависит от количества рецептов с одинаковым
+    значением. Поля берутся из сортировки, заданной фильтрами (например,
+    (-rank, id) при поиске по релевантности). Если среди полей
+    сортировки нет id, он добавляется.
+
+    Пустой параметр ?cursor= открывает первую страницу.
+    """
+    page_size = PAGE_SIZE
+    page_size_query_param = 'limit'
+    ordering = 'id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        if reverse:
+            queryset = queryset.order_by(*(
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in self.ordering
+            ))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if self.cursor is not None:
+            try:
+                queryset = queryset.filter(
+                    self.get_keyset_filter(self.cursor.position, reverse)
+                )
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > len(self.page)
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = self.cursor is not None and bool(self.page)
+        if self.page:
+            self.previous_position = self.get_position(self.page[0])
+            self.next_position = self.get_position(self.page[-1])
+        else:
+            self.has_next = self.has_previous = False
+        if self.has_previous or self.has_next:
+            self.display_page_controls = True
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        ordering = queryset.query.order_by or super().get_ordering(
+            request, queryset, view
+        )
+        if not {'id', '-id', 'pk', '-pk'} & set(ordering):
+            ordering = (*ordering, 'id')
+        return ordering
+
+    def decode_cursor(self, request):
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+        cursor = super().decode_cursor(request)
+        try:
+            position = json.loads(cursor.position)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if (
+            not isinstance(position, list)
+            or len(position) != len(self.ordering)
+            or not all(
+                isinstance(value, (int, float, str)) for value in position
+            )
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor._replace(offset=0, position=position)
+
+    def get_keyset_filter(self, position, reverse):
+        """
+        Возвращает условие для объектов после позиции курсора
+        (перед ней, если reverse) в порядке self.ordering.
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def get_position(self, instance):
+        return json.dumps([
+            getattr(instance, field.lstrip('-')) for field in self.ordering
+        ])
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(0, False, self.next_position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(Cursor(0, True, self.previous_position))
 
 
 class RecipePagination(PageNumberPagination):
+    """
+    Постраничная пагинация ?page=&limit=.
+
+    Если в запросе есть параметр ?cursor=, используется курсорная
+    пагинация RecipeCursorPagination со ссылками next/previous.
+    """
     page_size = PAGE_SIZE
     page_size_query_param = 'limit'
+    cursor_query_param = RecipeCursorPagination.cursor_query_param
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_pagination = None
+        if self.cursor_query_param in request.query_params:
+            self.cursor_pagination = RecipeCursorPagination()
+            return self.cursor_pagination.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_pagination is not None:
+            return self.cursor_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Асинхронный вариант постраничной пагинации: количество объектов
+        и страница загружаются асинхронным ORM. Курсорную пагинацию
+        обрабатывает синхронное представление.
+        """
+        if self.cursor_query_param in request.query_params:
+            raise Delegate
+        self.cursor_pagination = None
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+        bottom = (number - 1) * paginator.per_page
+        top = min(bottom + paginator.per_page, paginator.count)
+        self.page = paginator._get_page(
+            [obj async for obj in queryset[bottom:top]], number, paginator
+        )
+        self.request = request
+        return list(self.page)
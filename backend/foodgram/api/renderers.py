@@ -0,0 +1,85 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ShoppingListStreamMixin:
+    """
+    Миксин для рендереров списка покупок.
+
+    Список отдается потоком строк через stream(), render() используется
+    только для ответов целиком (например, сообщений об ошибках).
+    Подкласс должен определить stream(ingredients) - генератор строк
+    ответа по строкам списка покупок.
+    """
+
+    @property
+    def content_type(self):
+        if self.charset:
+            return f'{self.media_type}; charset={self.charset}'
+        return self.media_type
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            return '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return ''.join(self.stream(data))
+
+
+class ShoppingListTextRenderer(ShoppingListStreamMixin, BaseRenderer):
+    """Список покупок в виде текстового файла."""
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def stream(self, ingredients):
+        for ingredient in ingredients:
+            yield (
+                f"{ingredient['name']} - {ingredient['total']} "
+                f"({ingredient['unit']})\n"
+            )
+
+
+class Echo:
+    """Буфер для csv.writer, который возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListCSVRenderer(ShoppingListStreamMixin, BaseRenderer):
+    """Список покупок в формате CSV."""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'amount', 'measurement_unit'))
+        for ingredient in ingredients:
+            yield writer.writerow(
+                (ingredient['name'], ingredient['total'], ingredient['unit'])
+            )
+
+
+class ShoppingListJSONRenderer(ShoppingListStreamMixin, JSONRenderer):
+    """Список покупок в формате JSON."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer.render(
+            self, data, accepted_media_type, renderer_context
+        )
+
+    def stream(self, ingredients):
+        separator = '['
+        for ingredient in ingredients:
+            yield separator + json.dumps(
+                {
+                    'name': ingredient['name'],
+                    'amount': ingredient['total'],
+                    'measurement_unit': ingredient['unit'],
+                },
+                ensure_ascii=False,
+            )
+            separator = ','
+        yield ']' if separator == ',' else '[]'
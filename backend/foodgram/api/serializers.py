@@ -1,35 +1,45 @@
-from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from api.mixins import SerializationMetricsMixin
+from api.utils import get_image_variant_urls, get_subscribed_author_ids
 from recipes.models import (
     Favorite,
     IngredientInRecipe,
     Ingredients,
     Recipes,
     ShoppingCart,
+    ShoppingListItem,
     Tags,
     UserRecipe
 )
 from users.models import Subscribes, User
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SerializationMetricsMixin,
+                     serializers.ModelSerializer):
     """Базовый сериализатор для пользователей."""
     is_subscribed = serializers.SerializerMethodField()
     avatar = Base64ImageField(required=False)
+    avatar_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
-                  'is_subscribed', 'avatar')
+                  'is_subscribed', 'avatar', 'avatar_variants')
+
+    def get_avatar_variants(self, obj) -> dict:
+        return get_image_variant_urls(
+            obj.avatar_variants, self.context.get('request')
+        )
 
     def get_is_subscribed(self, obj):
         """Проверяет подписан ли текущий пользователь на этого пользователя."""
-        user = self.context['request'].user
-        if not user.is_authenticated:
+        request = self.context['request']
+        if not request.user.is_authenticated:
             return False
-        return Subscribes.objects.filter(user=user, author=obj).exists()
+        return obj.pk in get_subscribed_author_ids(request)
 
 
 class UserSubscribeSerializer(UserSerializer):
@@ -44,6 +54,8 @@ class UserSubscribeSerializer(UserSerializer):
         )
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'limited_recipes'):
+            return RecipeShortSerializer(obj.limited_recipes, many=True).data
         request = self.context.get('request')
         recipes = obj.recipes.all()
         limit = request.query_params.get('recipes_limit')
@@ -52,6 +64,8 @@ class UserSubscribeSerializer(UserSerializer):
         return RecipeShortSerializer(recipes, many=True).data
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
     def validate(self, data):
@@ -82,15 +96,23 @@ class UserSubscribeSerializer(UserSerializer):
         return data
 
 
-class RecipeShortSerializer(serializers.ModelSerializer):
+class RecipeShortSerializer(SerializationMetricsMixin,
+                            serializers.ModelSerializer):
     """Сериализатор для рецептов при отображении в подписках."""
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipes
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+    def get_image_variants(self, obj) -> dict:
+        return get_image_variant_urls(
+            obj.image_variants, self.context.get('request')
+        )
 
 
-class IngredientsSerializer(serializers.ModelSerializer):
+class IngredientsSerializer(SerializationMetricsMixin,
+                            serializers.ModelSerializer):
     """Сериализатор для ингредиентов."""
 
     class Meta:
@@ -98,7 +120,8 @@ class IngredientsSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
-class TagsSerializer(serializers.ModelSerializer):
+class TagsSerializer(SerializationMetricsMixin,
+                     serializers.ModelSerializer):
     """Сериализатор для тегов."""
     class Meta:
         model = Tags
@@ -115,7 +138,8 @@ class IngredientInRecipeCreateSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
-class RecipeWriteSerializer(serializers.ModelSerializer):
+class RecipeWriteSerializer(SerializationMetricsMixin,
+                            serializers.ModelSerializer):
     """Сериализатор для создания и изменения рецепта."""
     ingredients = IngredientInRecipeCreateSerializer(
         many=True,
@@ -136,6 +160,9 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         """
         Валидиурет список ингредиентов на ввод,
         дублирование, и наличие в базе.
+
+        Ингредиенты загружаются одним запросом и сохраняются в данных
+        под ключом ingredient для повторного использования.
         """
 
         if not value:
@@ -150,13 +177,15 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                 )
             unique_ingredients.add(ingredient["id"])
 
+        ingredients = Ingredients.objects.in_bulk(unique_ingredients)
+        missing = sorted(unique_ingredients - ingredients.keys())
+        if missing:
+            raise serializers.ValidationError(
+                'Ингредиентов с id '
+                f'{", ".join(map(str, missing))} не существует'
+            )
         for ingredient in value:
-            try:
-                Ingredients.objects.get(id=ingredient['id'])
-            except ObjectDoesNotExist:
-                raise serializers.ValidationError(
-                    f"Ингредиенты с id {ingredient['id']} не существует"
-                )
+            ingredient['ingredient'] = ingredients[ingredient['id']]
 
         return value
 
@@ -173,6 +202,14 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         return value
 
     def to_representation(self, instance):
+        # Сохраненные строки уже содержат объекты ингредиентов, передаем их
+        # как предзагруженные, чтобы ответ не запрашивал их повторно.
+        if hasattr(self, 'saved_ingredients'):
+            if not hasattr(instance, '_prefetched_objects_cache'):
+                instance._prefetched_objects_cache = {}
+            instance._prefetched_objects_cache[
+                'ingredients_in_recipe'
+            ] = self.saved_ingredients
         serializer = RecipeReadSerializer(
             instance, context={'request': self.context.get('request')}
         )
@@ -184,30 +221,100 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             objs.append(
                 IngredientInRecipe(
                     recipe=recipe,
-                    ingredient_id=ingredient['id'],
+                    ingredient=ingredient['ingredient'],
                     amount=ingredient['amount'],
                 )
             )
         IngredientInRecipe.objects.bulk_create(objs)
+        self.saved_ingredients = objs
 
     def create(self, validated_data):
         """Создает рецепт."""
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         user = self.context.get('request').user
-        recipe = Recipes.objects.create(**validated_data, author=user)
-        recipe.tags.set(tags)
-        self.create_ingredients(ingredients, recipe)
+        with transaction.atomic():
+            recipe = Recipes.objects.create(**validated_data, author=user)
+            recipe.tags.set(tags)
+            self.create_ingredients(ingredients, recipe)
+            Recipes.objects.filter(pk=recipe.pk).update_search_vector()
         return recipe
 
+    def update_tags(self, recipe, tags):
+        """Добавляет новые и удаляет лишние теги рецепта."""
+        current = set(recipe.tags.values_list('id', flat=True))
+        new = {tag.id for tag in tags}
+        if new - current:
+            recipe.tags.add(*(new - current))
+        if current - new:
+            recipe.tags.remove(*(current - new))
+        return len(new ^ current)
+
+    def update_ingredients(self, recipe, ingredients):
+        """
+        Добавляет, изменяет и удаляет только те ингредиенты рецепта,
+        которые отличаются от сохраненных.
+
+        Изменения количеств переносятся в списки покупок пользователей,
+        у которых рецепт лежит в корзине.
+        """
+        current = {
+            row.ingredient_id: row
+            for row in recipe.ingredients_in_recipe.all()
+        }
+        amounts = {}
+        created, changed, saved = [], [], []
+        for ingredient in ingredients:
+            row = current.pop(ingredient['id'], None)
+            if row is None:
+                row = IngredientInRecipe(
+                    recipe=recipe,
+                    ingredient=ingredient['ingredient'],
+                    amount=ingredient['amount'],
+                )
+                created.append(row)
+                amounts[ingredient['id']] = ingredient['amount']
+            else:
+                row.ingredient = ingredient['ingredient']
+                if row.amount != ingredient['amount']:
+                    amounts[ingredient['id']] = (
+                        ingredient['amount'] - row.amount
+                    )
+                    row.amount = ingredient['amount']
+                    changed.append(row)
+            saved.append(row)
+        for ingredient_id, row in current.items():
+            amounts[ingredient_id] = -row.amount
+
+        IngredientInRecipe.objects.bulk_create(created)
+        IngredientInRecipe.objects.bulk_update(changed, ['amount'])
+        if current:
+            IngredientInRecipe.objects.filter(
+                pk__in=[row.pk for row in current.values()]
+            ).delete()
+        ShoppingListItem.objects.add_amounts(
+            recipe.in_shopping_cart.values_list('user_id', flat=True),
+            amounts,
+        )
+        self.saved_ingredients = saved
+        return len(created) + len(changed) + len(current)
+
     def update(self, instance, validated_data):
-        """Обновляет рецепт и заменяет ингредиенты и теги."""
+        """
+        Обновляет рецепт, изменяя только отличающиеся ингредиенты и теги.
+
+        Количество измененных строк ингредиентов и связей с тегами
+        сохраняется в атрибуте rows_changed.
+        """
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        instance = super().update(instance, validated_data)
-        instance.tags.set(tags)
-        instance.ingredients_in_recipe.all().delete()
-        self.create_ingredients(ingredients, instance)
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            self.rows_changed = (
+                self.update_tags(instance, tags)
+                + self.update_ingredients(instance, ingredients)
+            )
+            Recipes.objects.filter(pk=instance.pk).update_search_vector()
         return instance
 
 
@@ -224,7 +331,8 @@ class IngredientInRecipeReadSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(SerializationMetricsMixin,
+                           serializers.ModelSerializer):
     """
     Сериализатор:
     - для получения списка рецептов,
@@ -241,15 +349,23 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipes
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'image_variants',
+                  'text', 'cooking_time')
+
+    def get_image_variants(self, obj) -> dict:
+        return get_image_variant_urls(
+            obj.image_variants, self.context.get('request')
+        )
 
     def get_is_favorited(self, obj) -> bool:
         """Проверяет добавлен ли рецепт в избранное."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         if not user.is_authenticated:
             return False
@@ -257,13 +373,16 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj) -> bool:
         """Проверяет добавлен ли рецепт в список покупок."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         if not user.is_authenticated:
             return False
         return ShoppingCart.objects.filter(user=user, recipe=obj).exists()
 
 
-class UserRecipeBaseSerializer(serializers.ModelSerializer):
+class UserRecipeBaseSerializer(SerializationMetricsMixin,
+                               serializers.ModelSerializer):
 
     class Meta:
         model = UserRecipe
@@ -0,0 +1,122 @@
+import threading
+from collections import Counter
+
+from django.core.cache import caches
+from django.db import IntegrityError, connection
+from django.test import TransactionTestCase
+
+from api.tests.utils import create_recipes, create_user, get_client
+from api.utils import create_once
+from recipes.models import Favorite, Recipes, ShoppingCart, ShoppingListItem
+from users.models import Subscribes, User
+
+THREADS = 8
+ROUNDS = 3
+
+
+class ConcurrentRelationsTest(TransactionTestCase):
+    """
+    Одновременные POST и DELETE избранного, корзины и подписки.
+
+    Из одинаковых запросов, отправленных одновременно из нескольких
+    потоков, успешен ровно один, остальные получают 400. Счетчики и
+    агрегированный список покупок после этого совпадают с данными.
+    """
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.author = create_user('author')
+        self.user = create_user('buyer')
+        self.recipe = create_recipes(self.author, 1)[0]
+
+    def race(self, method, url):
+        """Отправляет запрос из THREADS потоков одновременно."""
+        clients = [get_client(self.user) for _ in range(THREADS)]
+        barrier = threading.Barrier(THREADS)
+        statuses = []
+        errors = []
+
+        def send(client):
+            try:
+                barrier.wait()
+                statuses.append(getattr(client, method)(url).status_code)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=send, args=(client,))
+            for client in clients
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return Counter(statuses)
+
+    def assert_race(self, url, check):
+        for _ in range(ROUNDS):
+            self.assertEqual(
+                self.race('post', url), {201: 1, 400: THREADS - 1}
+            )
+            check(1)
+            self.assertEqual(
+                self.race('delete', url), {204: 1, 400: THREADS - 1}
+            )
+            check(0)
+
+    def assert_shopping_list(self):
+        expected = {
+            (row['user_id'], row['ingredient_id']): row['total']
+            for row in ShoppingListItem.objects.live_totals()
+        }
+        actual = {
+            (item.user_id, item.ingredient_id): item.amount
+            for item in ShoppingListItem.objects.all()
+        }
+        self.assertEqual(actual, expected)
+
+    def test_favorite(self):
+        def check(count):
+            self.assertEqual(Favorite.objects.count(), count)
+            self.assertEqual(
+                Recipes.objects.get(pk=self.recipe.pk).favorites_count, count
+            )
+
+        self.assert_race(f'/api/recipes/{self.recipe.pk}/favorite/', check)
+
+    def test_shopping_cart(self):
+        def check(count):
+            self.assertEqual(ShoppingCart.objects.count(), count)
+            self.assertEqual(
+                Recipes.objects.get(pk=self.recipe.pk).in_carts_count, count
+            )
+            self.assertEqual(ShoppingListItem.objects.count(), 3 * count)
+            self.assert_shopping_list()
+
+        self.assert_race(
+            f'/api/recipes/{self.recipe.pk}/shopping_cart/', check
+        )
+
+    def test_subscribe(self):
+        def check(count):
+            self.assertEqual(Subscribes.objects.count(), count)
+            self.assertEqual(
+                User.objects.get(pk=self.author.pk).subscribers_count, count
+            )
+
+        self.assert_race(f'/api/users/{self.author.pk}/subscribe/', check)
+
+    def test_create_once_reraises_other_integrity_errors(self):
+        self.assertTrue(
+            create_once(Favorite, user=self.user, recipe=self.recipe)
+        )
+        self.assertFalse(
+            create_once(Favorite, user=self.user, recipe=self.recipe)
+        )
+        missing = Recipes.objects.order_by('-pk').first().pk + 1
+        with self.assertRaises(IntegrityError):
+            create_once(Favorite, user=self.user, recipe_id=missing)
+        self.assertEqual(Favorite.objects.count(), 1)
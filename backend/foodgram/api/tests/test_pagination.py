@@ -0,0 +1,113 @@
+from urllib.parse import urlencode
+
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.tests.utils import create_recipes, create_user, get_client
+from recipes.models import Recipes
+
+
+@override_settings(DATABASE_ROUTERS=[])
+class CursorPaginationTestCase(TestCase):
+    """Обход страниц курсорной пагинации по ссылкам next и previous."""
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.client = get_client()
+
+    def get_page(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for query in queries.captured_queries:
+            self.assertNotIn('OFFSET', query['sql'])
+            self.assertNotIn('COUNT(', query['sql'])
+        return response.json()
+
+    def assert_pages(self, url, expected):
+        """Проверяет порядок рецептов при обходе вперед и назад."""
+        page = self.get_page(url)
+        self.assertIsNone(page['previous'])
+        pages = [[recipe['id'] for recipe in page['results']]]
+        while page['next']:
+            page = self.get_page(page['next'])
+            pages.append([recipe['id'] for recipe in page['results']])
+        self.assertEqual(sum(pages, []), expected)
+
+        backwards = []
+        while page['previous']:
+            page = self.get_page(page['previous'])
+            backwards.insert(0, [recipe['id'] for recipe in page['results']])
+        self.assertEqual(backwards, pages[:-1])
+
+
+class RecipeCursorPaginationTest(CursorPaginationTestCase):
+    """
+    Курсорная пагинация по (-favorites_count, id): у большинства
+    рецептов одинаковое количество добавлений в избранное.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        recipes = create_recipes(cls.author, 23, 0, 0)
+        for recipe, count in zip(recipes[::5], (3, 1, 1, 7)):
+            recipe.favorites_count = count
+        Recipes.objects.bulk_update(recipes, ['favorites_count'])
+        cls.expected = list(
+            Recipes.objects.order_by('-favorites_count', 'id')
+            .values_list('id', flat=True)
+        )
+
+    def test_pages_follow_composite_keyset(self):
+        self.assert_pages(
+            '/api/recipes/?cursor=&limit=4&ordering=-favorites_count',
+            self.expected,
+        )
+
+    def test_invalid_cursor(self):
+        for cursor in ('abc', 'cD1bMV0=', 'cD1bImEiLCAxXQ=='):
+            with self.subTest(cursor):
+                response = self.client.get(
+                    '/api/recipes/',
+                    {'cursor': cursor, 'ordering': '-favorites_count'},
+                )
+                self.assertEqual(response.status_code, 404)
+
+
+class RecipeSearchCursorPaginationTest(CursorPaginationTestCase):
+    """
+    Курсорная пагинация результатов поиска сохраняет сортировку по
+    релевантности, в том числе для рецептов с одинаковым рангом.
+    """
+    TEXTS = ('суп', 'суп с грибами', 'грибной суп, суп', 'салат', 'суп суп')
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        recipes = create_recipes(author, 17, 0, 0)
+        for index, recipe in enumerate(recipes):
+            recipe.text = cls.TEXTS[index % len(cls.TEXTS)]
+        Recipes.objects.bulk_update(recipes, ['text'])
+        Recipes.objects.update_search_vector()
+
+    def test_search_pages_keep_rank_order(self):
+        first_page = self.client.get(
+            '/api/recipes/', {'search': 'суп', 'limit': 5}
+        ).json()
+        expected = [recipe['id'] for recipe in first_page['results']]
+        page = first_page
+        while page['next']:
+            page = self.client.get(page['next']).json()
+            expected += [recipe['id'] for recipe in page['results']]
+        self.assertEqual(len(expected), first_page['count'])
+        self.assertNotEqual(expected, sorted(expected))
+
+        params = {'cursor': '', 'search': 'суп', 'limit': 3}
+        self.assert_pages(f'/api/recipes/?{urlencode(params)}', expected)
+        params['ordering'] = '-favorites_count'
+        self.assert_pages(
+            f'/api/recipes/?{urlencode(params)}', sorted(expected)
+        )
@@ -0,0 +1,95 @@
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.tests.utils import create_recipes, create_user, get_client
+from recipes.models import Favorite, ShoppingCart
+
+LIMITS = (2, 6, 15)
+
+
+# Данные создаются только в основной базе, поэтому чтение из реплики
+# (если она настроена) отключено.
+@override_settings(DATABASE_ROUTERS=[])
+class RecipeListQueriesTest(TestCase):
+    """Количество SQL-запросов списка рецептов не зависит от его размера."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.user = create_user('reader')
+        cls.recipes = create_recipes(cls.author, 20)
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.user, recipe=recipe)
+            for recipe in cls.recipes[::2]
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.user, recipe=recipe)
+            for recipe in cls.recipes[::3]
+        )
+
+    def setUp(self):
+        caches['responses'].clear()
+        caches['reference'].clear()
+
+    def count_list_queries(self, client, limit):
+        caches['responses'].clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/recipes/', {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), limit)
+        return len(queries), response.json()['results']
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        for name, client in (
+            ('anonymous', get_client()),
+            ('authenticated', get_client(self.user)),
+        ):
+            with self.subTest(name):
+                counts = {
+                    limit: self.count_list_queries(client, limit)[0]
+                    for limit in LIMITS
+                }
+                self.assertEqual(
+                    len(set(counts.values())), 1,
+                    f'Количество запросов зависит от limit: {counts}',
+                )
+
+    def test_flags_are_annotated_for_authenticated_user(self):
+        favorited = {recipe.pk for recipe in self.recipes[::2]}
+        in_cart = {recipe.pk for recipe in self.recipes[::3]}
+        _, results = self.count_list_queries(
+            get_client(self.user), max(LIMITS)
+        )
+        for recipe in results:
+            self.assertEqual(recipe['is_favorited'], recipe['id'] in favorited)
+            self.assertEqual(
+                recipe['is_in_shopping_cart'], recipe['id'] in in_cart
+            )
+
+    def test_list_and_detail_query_count(self):
+        """
+        Автор, теги и ингредиенты загружаются для всей страницы.
+
+        Анонимный список: поколение списков для кэша ответов, COUNT,
+        рецепты с авторами, теги, ингредиенты. Детальная страница: версия
+        рецепта вместо поколения и COUNT. С токеном к ним добавляются
+        токен с пользователем и множество подписок, а поколение и версия
+        не читаются: ответы для пользователей не кэшируются.
+        """
+        recipe = self.recipes[0]
+        for name, client, list_queries, detail_queries in (
+            ('anonymous', get_client(), 5, 4),
+            ('authenticated', get_client(self.user), 6, 5),
+        ):
+            with self.subTest(name):
+                for limit in LIMITS:
+                    caches['responses'].clear()
+                    with self.assertNumQueries(list_queries):
+                        client.get('/api/recipes/', {'limit': limit})
+                caches['responses'].clear()
+                with self.assertNumQueries(detail_queries):
+                    response = client.get(f'/api/recipes/{recipe.pk}/')
+                self.assertEqual(len(response.json()['tags']), 2)
+                self.assertEqual(len(response.json()['ingredients']), 3)
@@ -0,0 +1,116 @@
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase
+from foodgram.constants import READ_YOUR_WRITES_COOKIE, REPLICA_DB_ALIAS
+from rest_framework.authtoken.models import Token
+
+from api.db_routers import ReplicaRouter
+from api.tests.utils import create_recipes, create_user, get_client
+from recipes.models import Favorite, Recipes
+from users.models import User
+
+
+def copy_to_replica(*objects):
+    """Копирует строки объектов в реплику с теми же первичными ключами."""
+    for obj in objects:
+        type(obj).objects.using(REPLICA_DB_ALIAS).bulk_create([obj])
+
+
+@skipUnless(
+    REPLICA_DB_ALIAS in settings.DATABASES,
+    'Реплика не настроена (DB_REPLICA_HOST).'
+)
+class ReplicaRoutingTest(TestCase):
+    """
+    Маршрутизация запросов к API между основной базой и репликой.
+
+    Реплика — отдельная тестовая база, данные в нее копируются явно,
+    поэтому расхождение баз имитирует отставание реплики.
+    """
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.user = create_user('reader')
+        cls.token = Token.objects.create(user=cls.user)
+        copy_to_replica(cls.author, cls.user, cls.token)
+        cls.recipe = create_recipes(cls.author, 1)[0]
+        copy_to_replica(Recipes.objects.get(pk=cls.recipe.pk))
+        cls.primary_only = create_recipes(
+            cls.author, 1, tags_count=0, ingredients_count=0
+        )[0]
+
+    def setUp(self):
+        caches[settings.RESPONSE_CACHE_ALIAS].clear()
+        self.client = get_client(self.user)
+
+    def get_recipe(self, client, recipe):
+        return client.get(f'/api/recipes/{recipe.pk}/')
+
+    def favorite(self):
+        response = self.client.post(
+            f'/api/recipes/{self.recipe.pk}/favorite/'
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_safe_requests_read_replica(self):
+        self.assertEqual(
+            self.get_recipe(get_client(), self.primary_only).status_code, 404
+        )
+        self.assertEqual(
+            self.get_recipe(self.client, self.primary_only).status_code, 404
+        )
+        self.assertEqual(
+            self.get_recipe(self.client, self.recipe).status_code, 200
+        )
+
+    def test_writes_and_following_reads_use_primary(self):
+        response = self.client.post(
+            f'/api/recipes/{self.primary_only.pk}/favorite/'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(
+            Favorite.objects.filter(recipe=self.primary_only).exists()
+        )
+        self.assertFalse(
+            Favorite.objects.using(REPLICA_DB_ALIAS).exists()
+        )
+
+    def test_token_marker_keeps_reads_on_primary(self):
+        self.favorite()
+        self.client.cookies.clear()
+        self.assertTrue(
+            self.get_recipe(self.client, self.recipe).json()['is_favorited']
+        )
+        other = create_user('other')
+        copy_to_replica(other, Token.objects.create(user=other))
+        self.assertEqual(
+            self.get_recipe(get_client(other), self.primary_only).status_code,
+            404,
+        )
+        caches[settings.RESPONSE_CACHE_ALIAS].clear()
+        self.assertFalse(
+            self.get_recipe(self.client, self.recipe).json()['is_favorited']
+        )
+
+    def test_cookie_keeps_reads_on_primary(self):
+        self.favorite()
+        self.assertIn(READ_YOUR_WRITES_COOKIE, self.client.cookies)
+        caches[settings.RESPONSE_CACHE_ALIAS].clear()
+        self.assertTrue(
+            self.get_recipe(self.client, self.recipe).json()['is_favorited']
+        )
+        self.client.cookies.clear()
+        self.assertFalse(
+            self.get_recipe(self.client, self.recipe).json()['is_favorited']
+        )
+
+    def test_reads_outside_api_requests_use_primary(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(User), 'default')
+        self.assertEqual(router.db_for_write(User), 'default')
+        self.assertTrue(router.allow_migrate('default', 'recipes'))
+        self.assertTrue(router.allow_migrate(REPLICA_DB_ALIAS, 'recipes'))
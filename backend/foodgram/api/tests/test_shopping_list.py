@@ -0,0 +1,47 @@
+from django.test import TestCase
+
+from api.tests.utils import create_recipes, create_user
+from recipes.models import ShoppingCart, ShoppingListItem
+
+
+class LiveTotalsTest(TestCase):
+    """
+    Суммы списка покупок, посчитанные напрямую по корзинам.
+
+    Рецепт в корзинах нескольких пользователей учитывается в списке
+    каждого из них один раз.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        cls.first = create_user('first')
+        cls.second = create_user('second')
+        cls.shared, cls.own = create_recipes(author, 2, ingredients_count=2)
+        ShoppingCart.objects.bulk_create([
+            ShoppingCart(user=cls.first, recipe=cls.shared),
+            ShoppingCart(user=cls.first, recipe=cls.own),
+            ShoppingCart(user=cls.second, recipe=cls.shared),
+        ])
+
+    def get_totals(self, user_ids=None):
+        return {
+            (row['user_id'], row['ingredient_id']): row['total']
+            for row in ShoppingListItem.objects.live_totals(user_ids)
+        }
+
+    def get_expected(self, user, *recipes):
+        expected = {}
+        for recipe in recipes:
+            for item in recipe.ingredients_in_recipe.all():
+                key = (user.pk, item.ingredient_id)
+                expected[key] = expected.get(key, 0) + item.amount
+        return expected
+
+    def test_totals_by_user(self):
+        first = self.get_expected(self.first, self.shared, self.own)
+        second = self.get_expected(self.second, self.shared)
+        self.assertEqual(self.get_totals(), first | second)
+        self.assertEqual(self.get_totals([self.first.pk]), first)
+        self.assertEqual(self.get_totals([self.second.pk]), second)
+        self.assertEqual(self.get_totals([]), {})
@@ -0,0 +1,67 @@
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import IngredientInRecipe, Ingredients, Recipes, Tags
+from users.models import User
+
+RECIPE_IMAGE = 'media/recipes/images/test.jpg'
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        first_name=username,
+        last_name=username,
+        password='password',
+    )
+
+
+def create_recipes(author, count, tags_count=2, ingredients_count=3,
+                   using='default'):
+    """
+    Создает рецепты автора с тегами и ингредиентами.
+
+    Используется bulk_create, поэтому сигналы (версии, изображения,
+    ссылки на файлы) не срабатывают. using — алиас базы.
+    """
+    tags = Tags.objects.using(using).bulk_create(
+        Tags(name=f'{author.username}-tag-{index}',
+             slug=f'{author.username}-tag-{index}')
+        for index in range(tags_count)
+    )
+    ingredients = Ingredients.objects.using(using).bulk_create(
+        Ingredients(name=f'{author.username}-ingredient-{index}',
+                    measurement_unit='г')
+        for index in range(ingredients_count)
+    )
+    recipes = Recipes.objects.using(using).bulk_create(
+        Recipes(
+            name=f'Рецепт {index}',
+            image=RECIPE_IMAGE,
+            text='Описание',
+            cooking_time=10,
+            author=author,
+        )
+        for index in range(count)
+    )
+    Recipes.tags.through.objects.using(using).bulk_create(
+        Recipes.tags.through(recipes_id=recipe.pk, tags_id=tag.pk)
+        for recipe in recipes
+        for tag in tags
+    )
+    IngredientInRecipe.objects.using(using).bulk_create(
+        IngredientInRecipe(recipe=recipe, ingredient=ingredient, amount=100)
+        for recipe in recipes
+        for ingredient in ingredients
+    )
+    return recipes
+
+
+def get_client(user=None):
+    """Возвращает клиент API, авторизованный токеном пользователя."""
+    client = APIClient()
+    if user is not None:
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
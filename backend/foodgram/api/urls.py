@@ -1,11 +1,14 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from api.async_views import async_urls
 from api.views import (
     IngredientsViewSet,
     RecipesViewSet,
     TagsViewSet,
-    UserAccauntViewSet
+    UserAccauntViewSet,
+    metrics
 )
 
 router = DefaultRouter()
@@ -17,5 +20,11 @@ router.register('tags', TagsViewSet)
 
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path('_metrics', metrics, name='metrics'),
+    path(
+        '',
+        include(
+            async_urls(router.urls) if settings.ASYNC_VIEWS else router.urls
+        ),
+    ),
 ]
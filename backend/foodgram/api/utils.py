@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from recipes.models import DataVersion, Tags
+from users.models import Subscribes
+
+SUBSCRIPTIONS_CACHE_ATTR = '_subscribed_author_ids'
+
+
+def get_subscribed_author_ids(request):
+    """
+    Возвращает множество id авторов, на которых подписан пользователь.
+
+    Множество загружается одним запросом и хранится в объекте запроса,
+    поэтому все сериализаторы в рамках запроса используют его повторно.
+    """
+    author_ids = getattr(request, SUBSCRIPTIONS_CACHE_ATTR, None)
+    if author_ids is None:
+        author_ids = set(
+            Subscribes.objects.filter(user=request.user)
+            .values_list('author_id', flat=True)
+        )
+        setattr(request, SUBSCRIPTIONS_CACHE_ATTR, author_ids)
+    return author_ids
+
+
+async def aget_subscribed_author_ids(request):
+    """Асинхронный вариант get_subscribed_author_ids."""
+    author_ids = getattr(request, SUBSCRIPTIONS_CACHE_ATTR, None)
+    if author_ids is None:
+        author_ids = {
+            author_id async for author_id in Subscribes.objects.filter(
+                user=request.user
+            ).values_list('author_id', flat=True)
+        }
+        setattr(request, SUBSCRIPTIONS_CACHE_ATTR, author_ids)
+    return author_ids
+
+
+def reset_subscribed_author_ids(request):
+    """Сбрасывает множество подписок после их изменения в запросе."""
+    if hasattr(request, SUBSCRIPTIONS_CACHE_ATTR):
+        delattr(request, SUBSCRIPTIONS_CACHE_ATTR)
+
+
+def create_once(model, **fields):
+    """
+    Создает объект model одним INSERT и сообщает, создан ли он.
+
+    Возвращает False, если такая запись уже есть (одновременный запрос
+    успел ее создать и INSERT нарушил ограничение уникальности). Другие
+    ошибки целостности, например внешний ключ на одновременно удаленный
+    объект, пробрасываются дальше.
+    """
+    try:
+        with transaction.atomic():
+            model.objects.create(**fields)
+    except IntegrityError:
+        if model.objects.filter(**fields).exists():
+            return False
+        raise
+    return True
+
+
+def change_counter(queryset, field, delta):
+    """Атомарно изменяет счетчик в базе, не опуская его ниже нуля."""
+    queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def get_tag_ids_by_slug():
+    """
+    Возвращает словарь {слаг: id} всех тегов.
+
+    Словарь хранится в кэше справочников под текущей версией тегов,
+    поэтому после изменения тегов он сразу перестраивается.
+    """
+    version = DataVersion.objects.get_version('tags')
+    cache = caches[settings.REFERENCE_CACHE_ALIAS]
+    key = f'tag-slugs:{version}'
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tags.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids)
+    return tag_ids
+
+
+def get_image_variant_urls(variants, request):
+    """
+    Возвращает абсолютные адреса уменьшенных вариантов изображения
+    в виде {вариант: {формат: адрес}}.
+
+    Без запроса в контексте адреса относительные, как у ImageField.
+    Пока варианты не построены, возвращается пустой словарь.
+    """
+    def get_url(name):
+        url = default_storage.url(name)
+        return request.build_absolute_uri(url) if request else url
+
+    return {
+        variant: {
+            image_format: get_url(name)
+            for image_format, name in formats.items()
+        }
+        for variant, formats in variants.items()
+        if variant != 'source'
+    }
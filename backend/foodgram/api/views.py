@@ -1,8 +1,12 @@
-from django.db.models import Count, F, Prefetch, Sum
-from django.http import Http404, HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
+from foodgram.constants import SHOPPING_LIST_CHUNK_SIZE
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import (
@@ -12,10 +16,26 @@ from rest_framework.permissions import (
 )
 from rest_framework.response import Response
 
-from api.filters import IngredientFilter, RecipeFilter
-from api.mixins import RecipeCreateDeleteMixin
+from api.async_views import AsyncViewSetMixin, to_list
+from api.filters import (
+    IngredientFilter,
+    RecipeFilter,
+    RecipeOrderingFilter,
+    RecipeSearchFilter
+)
+from api.metrics import registry
+from api.mixins import (
+    RecipeCreateDeleteMixin,
+    RecipeResponseCacheMixin,
+    ReferenceDataCacheMixin
+)
 from api.pagination import RecipePagination
 from api.permissions import IsAuthorOrReadOnly
+from api.renderers import (
+    ShoppingListCSVRenderer,
+    ShoppingListJSONRenderer,
+    ShoppingListTextRenderer
+)
 from api.serializers import (
     FavoriteSerializer,
     IngredientsSerializer,
@@ -26,18 +46,25 @@ from api.serializers import (
     UserSerializer,
     UserSubscribeSerializer
 )
+from api.utils import (
+    aget_subscribed_author_ids,
+    change_counter,
+    create_once,
+    reset_subscribed_author_ids
+)
 from recipes.models import (
     Favorite,
     IngredientInRecipe,
     Ingredients,
     Recipes,
     ShoppingCart,
+    ShoppingListItem,
     Tags
 )
 from users.models import Subscribes, User
 
 
-class UserAccauntViewSet(UserViewSet):
+class UserAccauntViewSet(AsyncViewSetMixin, UserViewSet):
     """
     Вьюсет для работы с пользователями.
 
@@ -52,6 +79,7 @@ class UserAccauntViewSet(UserViewSet):
     queryset = User.objects.all()
     permission_classes = [IsAuthorOrReadOnly]
     pagination_class = RecipePagination
+    async_actions = ('subscriptions',)
 
     def get_serializers_class(self):
         """
@@ -69,18 +97,49 @@ class UserAccauntViewSet(UserViewSet):
         url_name='subscribe',
     )
     def subscribe(self, request, *args, **kwargs):
-        """Реализует логику подписки и отписки на пользователя."""
+        """
+        Реализует логику подписки и отписки на пользователя.
+
+        Подписка создается одним INSERT, повторная подписка отклоняется
+        ограничением уникальности. Отписка выполняется одним DELETE.
+        """
         author = self.get_object()
         user = request.user
         if request.method == 'POST':
-            Subscribes.objects.create(user=user, author=author)
+            if user == author:
+                return Response(
+                    {'errors': 'Нельзя подписываться на самого себя.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            with transaction.atomic():
+                if not create_once(Subscribes, user=user, author=author):
+                    return Response(
+                        {'errors': 'Вы уже подписаны на этого пользователя.'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                change_counter(
+                    User.objects.filter(pk=author.pk), 'subscribers_count', 1
+                )
+            reset_subscribed_author_ids(request)
             serializer = UserSubscribeSerializer(
                 author, context={"request": request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        elif request.method == 'DELETE':
-            Subscribes.objects.filter(user=user, author=author).delete()
+        with transaction.atomic():
+            deleted, _ = Subscribes.objects.filter(
+                user=user, author=author
+            ).delete()
+            if deleted:
+                change_counter(
+                    User.objects.filter(pk=author.pk), 'subscribers_count', -1
+                )
+        if not deleted:
+            return Response(
+                {'errors': 'Вы не подписаны на этого пользователя.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        reset_subscribed_author_ids(request)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -95,30 +154,70 @@ class UserAccauntViewSet(UserViewSet):
         Возвращает пользователей, на которых подписан текущий пользователь.
         В выдачу добавляются рецепты.
         """
-        user = request.user
-        authors = (
-            User.objects.filter(subscriber__user=user)
-            .prefetch_related(
-                Prefetch(
-                    'recipes',
-                    queryset=Recipes.objects.only(
-                        'id', 'name', 'image', 'cooking_time'
-                    ),
-                )
-            )
-            .annotate(recipes_count=Count('recipes'))
-        )
+        authors = self.get_subscriptions_queryset()
         page = self.paginate_queryset(authors)
-        if page is not None:
-            serializer = UserSubscribeSerializer(
-                page, many=True, context={'request': request}
-            )
-            return self.get_paginated_response(serializer.data)
+        authors = list(authors if page is None else page)
+        self.attach_recipes(authors, self.get_limited_recipes(authors))
+        return self.get_subscriptions_response(authors, page is not None)
+
+    async def asubscriptions(self, request):
+        """Асинхронный вариант subscriptions."""
+        authors = self.get_subscriptions_queryset()
+        page = await self.apaginate_queryset(authors)
+        authors = page if page is not None else await to_list(authors)
+        self.attach_recipes(
+            authors, await to_list(self.get_limited_recipes(authors))
+        )
+        return self.get_subscriptions_response(authors, page is not None)
+
+    async def ainitial(self, request):
+        if request.user.is_authenticated:
+            await aget_subscribed_author_ids(request)
+
+    def get_subscriptions_queryset(self):
+        return User.objects.filter(
+            subscriber__user=self.request.user
+        ).annotate(recipes_count=Count('recipes')).order_by('username')
+
+    def get_subscriptions_response(self, authors, paginated):
         serializer = UserSubscribeSerializer(
-            authors, many=True, context={'request': request}
+            authors, many=True, context={'request': self.request}
         )
+        if paginated:
+            return self.get_paginated_response(serializer.data)
         return Response(serializer.data)
 
+    def get_limited_recipes(self, authors):
+        """
+        Возвращает queryset первых recipes_limit рецептов каждого автора.
+
+        Рецепты нумеруются оконной функцией ROW_NUMBER в разрезе автора,
+        поэтому загружаются одним запросом.
+        """
+        limit = self.request.query_params.get('recipes_limit')
+        recipes = Recipes.objects.filter(author__in=authors).only(
+            'id', 'name', 'image', 'image_variants', 'cooking_time',
+            'author_id'
+        )
+        if limit and limit.isdigit():
+            recipes = recipes.annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F('author_id'),
+                    order_by=F('id').asc(),
+                )
+            ).filter(row_number__lte=int(limit))
+        return recipes
+
+    @staticmethod
+    def attach_recipes(authors, recipes):
+        """Сохраняет рецепты каждого автора в атрибут limited_recipes."""
+        recipes_by_author = {author.pk: [] for author in authors}
+        for recipe in recipes:
+            recipes_by_author[recipe.author_id].append(recipe)
+        for author in authors:
+            author.limited_recipes = recipes_by_author[author.pk]
+
     @action(
         detail=False,
         methods=['put', 'delete'],
@@ -139,17 +238,69 @@ class UserAccauntViewSet(UserViewSet):
             return Response(
                 {'avatar': user.avatar.url}, status=status.HTTP_200_OK
             )
-        user.avatar.delete(save=True)
+        # Файл может использоваться другими объектами, поэтому удаляется
+        # только ссылка на него, сам файл удалит collect_media.
+        user.avatar = None
+        user.save(update_fields=['avatar'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class RecipesViewSet(RecipeCreateDeleteMixin, viewsets.ModelViewSet):
+class RecipesViewSet(RecipeResponseCacheMixin, RecipeCreateDeleteMixin,
+                     AsyncViewSetMixin, viewsets.ModelViewSet):
     queryset = Recipes.objects.all()
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
     pagination_class = RecipePagination
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (
+        DjangoFilterBackend, RecipeOrderingFilter, RecipeSearchFilter
+    )
     filterset_class = RecipeFilter
-    search_fields = ('^name', 'name')
+    ordering_fields = ('favorites_count', 'in_carts_count')
+    ordering = ('id',)
+    async_actions = ('list', 'retrieve')
+
+    async def ainitial(self, request):
+        if request.user.is_authenticated:
+            await aget_subscribed_author_ids(request)
+
+    def get_queryset(self):
+        """
+        Для авторизованного пользователя вычисляет флаги is_favorited и
+        is_in_shopping_cart сразу для всей страницы в основном запросе.
+        Для чтения рецептов заранее подгружает автора, теги и ингредиенты.
+        """
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.select_related('author').prefetch_related(
+                Prefetch('tags', queryset=Tags.objects.all()),
+                Prefetch(
+                    'ingredients_in_recipe',
+                    queryset=IngredientInRecipe.objects.select_related(
+                        'ingredient'
+                    ),
+                ),
+            )
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(
+                    Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+                ),
+                is_in_shopping_cart=Exists(
+                    ShoppingCart.objects.filter(
+                        user=user, recipe=OuterRef('pk')
+                    )
+                ),
+            )
+        return queryset
+
+    def perform_destroy(self, instance):
+        """Удаляет рецепт и вычитает его из списков покупок."""
+        with transaction.atomic():
+            ShoppingListItem.objects.remove_recipe(
+                instance,
+                instance.in_shopping_cart.values_list('user_id', flat=True),
+            )
+            instance.delete()
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve', 'get-link'):
@@ -202,36 +353,49 @@ class RecipesViewSet(RecipeCreateDeleteMixin, viewsets.ModelViewSet):
         detail=False,
         methods=['get'],
         permission_classes=[IsAuthenticated],
+        renderer_classes=(
+            ShoppingListTextRenderer,
+            ShoppingListCSVRenderer,
+            ShoppingListJSONRenderer,
+        ),
         url_path='download_shopping_cart',
         url_name='download_shopping_cart'
     )
     def download_shopping_cart(self, request):
-        """Получает файл в формате .txt с общим списком ингредиентов."""
-        # Получаем ингредиенты из рецептов в списке покупок пользователя.
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__in_shopping_cart__user=request.user
+        """
+        Отдает файл с общим списком ингредиентов.
+
+        Формат выбирается параметром ?format=txt|csv|json (по умолчанию txt).
+        Список читается из заранее агрегированной таблицы ShoppingListItem
+        и передается потоком через серверный курсор.
+        """
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
         ).values(
             name=F('ingredient__name'),
             unit=F('ingredient__measurement_unit'),
-        ).annotate(
-            total=Sum('amount')
+            total=F('amount'),
+        ).order_by('name')
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(
+                ingredients.iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+            ),
+            content_type=renderer.content_type,
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{renderer.format}"'
         )
-        # Формируем строки для каждого ингредиента
-        lines = [
-            f"{ingredient['name']} - {ingredient['total']} "
-            f"({ingredient['unit']})"
-            for ingredient in ingredients
-        ]
-        content = '\\n'.join(lines)
-        response = HttpResponse(content, content_type='text/plain')
         return response
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(ReferenceDataCacheMixin, AsyncViewSetMixin,
+                         viewsets.ReadOnlyModelViewSet):
     """
     Вьюсет для отображения ингредиентов.
 
     Предоставляет доступ только для чтения всех объектов модели Ingredients.
+    Полный список без параметров отдается из кэша справочников.
 
     Эндпоинты:
     - /api/ingredients/
@@ -239,17 +403,21 @@ class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
     """
     queryset = Ingredients.objects.all()
     serializer_class = IngredientsSerializer
+    reference_name = 'ingredients'
     permission_classes = (AllowAny,)
     filter_backends = (IngredientFilter,)
     filterset_class = IngredientFilter
     search_fields = ('^name',)
+    async_actions = ('list', 'retrieve')
 
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+class TagsViewSet(ReferenceDataCacheMixin, AsyncViewSetMixin,
+                  viewsets.ReadOnlyModelViewSet):
     """
     Вьюсет для отображения тегов.
 
     Предоставляет доступ только для чтения всех объектов модели Tags.
+    Список отдается из кэша справочников.
 
     Эндпоинты:
     - /api/tags/
@@ -257,4 +425,24 @@ class TagsViewSet(viewsets.ReadOnlyModelViewSet):
     """
     queryset = Tags.objects.all()
     serializer_class = TagsSerializer
+    reference_name = 'tags'
     permission_classes = (IsAuthorOrReadOnly,)
+    async_actions = ('list', 'retrieve')
+
+
+def metrics(request):
+    """
+    Отдает метрики API в текстовом формате Prometheus.
+
+    Доступно только с адресов из METRICS_ALLOWED_IPS, для остальных
+    эндпоинт не существует.
+    """
+    if (
+        not settings.API_METRICS_ENABLED
+        or request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS
+    ):
+        raise Http404
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -7,10 +7,40 @@ For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 """
 
+import asyncio
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
+
+class ConcurrencyLimit:
+    """
+    Ограничивает число HTTP-запросов, которые воркер обрабатывает
+    одновременно.
+
+    Под ASGI синхронный код каждого запроса (ORM, DRF) выполняется в
+    отдельном потоке со своим соединением с базой, поэтому без
+    ограничения сотни клиентских соединений открыли бы столько же
+    соединений с PostgreSQL. Запросы сверх лимита ждут своей очереди.
+    """
+
+    def __init__(self, app, limit):
+        self.app = app
+        self.semaphore = asyncio.Semaphore(limit)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        async with self.semaphore:
+            return await self.app(scope, receive, send)
+
+
 application = get_asgi_application()
+
+if settings.ASGI_MAX_CONCURRENT_REQUESTS:
+    application = ConcurrencyLimit(
+        application, settings.ASGI_MAX_CONCURRENT_REQUESTS
+    )
@@ -10,8 +10,45 @@ MAX_LENGTH_MEASUREMENT_UNIT = 64
 MAX_LENGTH_TAG_NAME = 32
 MAX_LENGTH_TAG_SLUG = 32
 MIN_VALUE_COOKING_TIME = 1
+# Уменьшенные варианты изображений: {вариант: (ширина, высота)}.
+RECIPE_IMAGE_VARIANTS = {'thumbnail': (480, 320), 'detail': (1200, 800)}
+AVATAR_IMAGE_VARIANTS = {'small': (64, 64), 'medium': (192, 192)}
+# Форматы вариантов: {формат Pillow: (расширение, параметры сохранения)}.
+IMAGE_VARIANT_FORMATS = {
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+IMAGE_VARIANTS_PATH = 'media/variants/'
+# Каталог файлов, названных по SHA-256 содержимого.
+CONTENT_STORAGE_PATH = 'media/content/'
+# Файлы без ссылок удаляются не раньше, чем через это время (в секундах),
+# чтобы не удалить файл загрузки, которая еще не сохранена в базе.
+MEDIA_GC_GRACE_PERIOD = 60 * 60
+INGREDIENTS_BATCH_SIZE = 1000
+MAX_LENGTH_DATA_VERSION_NAME = 64
+MAX_LENGTH_MEDIA_FILE_NAME = 255
+DATASET_BATCH_SIZE = 5000
 # Константы для приложения API:
 PAGE_SIZE = 6
+SHOPPING_LIST_CHUNK_SIZE = 2000
+INGREDIENTS_SEARCH_LIMIT = 20
+# Время (в секундах), на которое один запрос получает право пересчитать
+# устаревший закэшированный ответ; остальные в это время получают
+# устаревший ответ.
+RESPONSE_CACHE_LOCK_TIMEOUT = 10
+# Конфигурация полнотекстового поиска PostgreSQL (русская морфология).
+SEARCH_CONFIG = 'russian'
+# Границы корзин гистограмм метрик API (секунды и количество запросов).
+METRICS_DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+METRICS_QUERIES_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+# Алиас реплики PostgreSQL в DATABASES.
+REPLICA_DB_ALIAS = 'replica'
+# Cookie и префикс ключа кэша, по которым пользователь после записи
+# читает из основной базы.
+READ_YOUR_WRITES_COOKIE = 'read_primary'
+READ_YOUR_WRITES_CACHE_PREFIX = 'read_primary'
 # Константы для админ-зоны:
 EXTRA_INGREDIENT = 1
 MIN_NUM_INGREDIENT = 1
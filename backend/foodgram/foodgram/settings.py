@@ -31,6 +31,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'django_filters',
@@ -41,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.ApiMetricsMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,6 +73,35 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+# Режим сервера: wsgi (синхронные воркеры gunicorn) или asgi (воркеры
+# uvicorn), выбирается в gunicorn.conf.py.
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+# Асинхронные представления чтения рецептов, справочников и подписок.
+# По умолчанию включены только в режиме asgi.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', str(SERVER_MODE == 'asgi')) == 'True'
+# Сколько HTTP-запросов воркер ASGI обрабатывает одновременно, остальные
+# ждут очереди (0 — без ограничения). Каждый запрос в обработке может
+# держать свое соединение с базой.
+ASGI_MAX_CONCURRENT_REQUESTS = int(
+    os.getenv('ASGI_MAX_CONCURRENT_REQUESTS', 16)
+)
+
+# Соединения с PostgreSQL. Без пула соединение переиспользуется между
+# запросами DB_CONN_MAX_AGE секунд и проверяется перед повторным
+# использованием. Под ASGI каждый запрос выполняется в новом потоке и не
+# может переиспользовать соединение, поэтому по умолчанию DB_CONN_MAX_AGE
+# там 0 и вместо него нужен пул.
+DB_CONN_MAX_AGE = int(
+    os.getenv('DB_CONN_MAX_AGE', 60 if SERVER_MODE == 'wsgi' else 0)
+)
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+# Пул соединений psycopg 3 в каждом воркере (нужен psycopg[pool]).
+# DB_POOL_TIMEOUT — сколько секунд запрос ждет свободного соединения.
+DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 2))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -78,9 +110,68 @@ DATABASES = {
         "PASSWORD": os.getenv("POSTGRES_PASSWORD"),
         "HOST": os.getenv("DB_HOST"),
         "PORT": os.getenv("DB_PORT", 5432),
+        # Пул сам держит и проверяет соединения, Django не разрешает
+        # совмещать его с CONN_MAX_AGE.
+        "CONN_MAX_AGE": 0 if DB_POOL else DB_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": DB_CONN_HEALTH_CHECKS,
+        "OPTIONS": {
+            "pool": {
+                "min_size": DB_POOL_MIN_SIZE,
+                "max_size": DB_POOL_MAX_SIZE,
+                "timeout": DB_POOL_TIMEOUT,
+            },
+        } if DB_POOL else {},
     }
 }
 
+# Реплика PostgreSQL для чтения безопасных запросов к API (включается
+# переменной DB_REPLICA_HOST). После записи пользователь читает из
+# основной базы DB_REPLICA_READ_YOUR_WRITES секунд.
+DB_REPLICA_HOST = os.getenv('DB_REPLICA_HOST')
+DB_REPLICA_READ_YOUR_WRITES = int(
+    os.getenv('DB_REPLICA_READ_YOUR_WRITES', 10)
+)
+if DB_REPLICA_HOST:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': DB_REPLICA_HOST,
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+    }
+    DATABASE_ROUTERS = ['api.db_routers.ReplicaRouter']
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'reference': {
+        'BACKEND': os.getenv(
+            'REFERENCE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('REFERENCE_CACHE_LOCATION', 'reference'),
+        'TIMEOUT': int(os.getenv('REFERENCE_CACHE_TIMEOUT', 60 * 60 * 24)),
+    },
+    'responses': {
+        'BACKEND': os.getenv(
+            'RESPONSE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION', 'responses'),
+        'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TIMEOUT', 60 * 60 * 24)),
+    },
+}
+
+REFERENCE_CACHE_ALIAS = 'reference'
+RESPONSE_CACHE_ALIAS = 'responses'
+
+# Метрики API: заголовок Server-Timing и гистограммы на /api/_metrics.
+API_METRICS_ENABLED = os.getenv('API_METRICS_ENABLED', 'True') == 'True'
+# Порог количества SQL-запросов, при превышении которого запросы пишутся
+# в лог (0 — не логировать).
+API_QUERY_COUNT_THRESHOLD = int(os.getenv('API_QUERY_COUNT_THRESHOLD', 0))
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1').split(',')
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -142,4 +233,8 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/backend_media/'
 
+# Количество потоков для построения уменьшенных вариантов изображений
+# (0 — строить сразу после сохранения в том же потоке).
+IMAGE_VARIANTS_WORKERS = int(os.getenv('IMAGE_VARIANTS_WORKERS', 2))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -0,0 +1,38 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from foodgram.constants import CONTENT_STORAGE_PATH
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище, в котором имя файла - SHA-256 его содержимого.
+
+    Повторная загрузка того же содержимого не создает новый файл, а
+    возвращает имя существующего. Содержимое файла по имени никогда не
+    меняется, поэтому его можно кэшировать бессрочно. Файлы удаляются
+    только командой collect_media после проверки ссылок.
+    """
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        hexdigest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        name = f'{CONTENT_STORAGE_PATH}{hexdigest[:2]}/{hexdigest}{extension}'
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+content_storage = ContentAddressedStorage()
+
+
+def get_content_storage():
+    return content_storage
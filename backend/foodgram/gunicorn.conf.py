@@ -0,0 +1,34 @@
+import multiprocessing
+import os
+
+# Настройки gunicorn, файл подхватывается автоматически при запуске
+# из каталога проекта: gunicorn
+#
+# SERVER_MODE=wsgi - синхронные воркеры, foodgram.wsgi;
+# SERVER_MODE=asgi - воркеры uvicorn, foodgram.asgi и асинхронные
+# представления чтения (ASYNC_VIEWS).
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+APPLICATIONS = {
+    'wsgi': ('sync', 'foodgram.wsgi:application'),
+    'asgi': ('uvicorn_worker.UvicornWorker', 'foodgram.asgi:application'),
+}
+if SERVER_MODE not in APPLICATIONS:
+    raise ValueError(
+        f'SERVER_MODE должен быть одним из {", ".join(APPLICATIONS)}, '
+        f'получено {SERVER_MODE!r}.'
+    )
+
+worker_class, wsgi_app = APPLICATIONS[SERVER_MODE]
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+# Синхронный воркер обрабатывает один запрос, воркер uvicorn - много
+# запросов на цикле событий, поэтому по умолчанию их меньше.
+workers = int(os.getenv(
+    'WEB_CONCURRENCY',
+    multiprocessing.cpu_count() * (2 if SERVER_MODE == 'wsgi' else 1) + 1
+))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+# Перезапуск воркеров ограничивает рост памяти процессов.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+accesslog = os.getenv('GUNICORN_ACCESS_LOG')
@@ -1,6 +1,6 @@
 from django.contrib import admin
-
 from foodgram.constants import EXTRA_INGREDIENT, MIN_NUM_INGREDIENT
+
 from recipes.models import (
     Favorite,
     IngredientInRecipe,
@@ -20,13 +20,16 @@ class IngredientInRecipeInline(admin.TabularInline):
 
 @admin.register(Recipes)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'text', 'author', 'favorite_count')
+    list_display = ('id', 'name', 'text', 'author', 'favorites_count',
+                    'in_carts_count')
     search_fields = ('name', 'author')
     list_filter = ('tags',)
+    readonly_fields = ('favorites_count', 'in_carts_count')
     inlines = (IngredientInRecipeInline,)
 
-    def favorite_count(self, obj):
-        return obj.favorite.count()
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        Recipes.objects.filter(pk=form.instance.pk).update_search_vector()
 
 
 @admin.register(Ingredients)
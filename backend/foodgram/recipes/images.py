@@ -0,0 +1,127 @@
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from foodgram.constants import IMAGE_VARIANT_FORMATS, IMAGE_VARIANTS_PATH
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+executor = None
+
+
+def get_executor():
+    """Возвращает пул потоков для обработки изображений."""
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(
+            settings.IMAGE_VARIANTS_WORKERS,
+            thread_name_prefix='image-variants',
+        )
+    return executor
+
+
+def render_variants(content, sizes):
+    """
+    Уменьшает изображение до каждого из размеров sizes во всех форматах
+    IMAGE_VARIANT_FORMATS.
+
+    Имена файлов строятся по хэшу исходного содержимого, поэтому уже
+    созданные варианты повторно не пересчитываются. Возвращает словарь
+    {вариант: {формат: имя файла}}.
+    """
+    digest = hashlib.sha256(content).hexdigest()[:32]
+    variants = {}
+    image = None
+    for variant, size in sizes.items():
+        variants[variant] = {}
+        for image_format, (extension, options) in (
+            IMAGE_VARIANT_FORMATS.items()
+        ):
+            name = f'{IMAGE_VARIANTS_PATH}{digest}-{variant}.{extension}'
+            variants[variant][image_format] = name
+            if default_storage.exists(name):
+                continue
+            if image is None:
+                image = ImageOps.exif_transpose(
+                    Image.open(io.BytesIO(content))
+                )
+            resized = image.copy()
+            resized.thumbnail(size, Image.LANCZOS)
+            if image_format == 'jpeg' and resized.mode != 'RGB':
+                resized = resized.convert('RGB')
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format.upper(), **options)
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def build_image_variants(model, pk, field_name, sizes):
+    """
+    Строит варианты изображения field_name объекта и сохраняет их имена
+    в поле {field_name}_variants.
+
+    Если за время обработки изображение заменили, результат не
+    сохраняется: новое изображение обрабатывается своей задачей.
+    Возвращает True, если варианты сохранены.
+    """
+    name = model.objects.filter(pk=pk).values_list(
+        field_name, flat=True
+    ).first()
+    if not name:
+        return False
+    with model._meta.get_field(field_name).storage.open(name) as file:
+        content = file.read()
+    variants = {'source': name, **render_variants(content, sizes)}
+    return bool(
+        model.objects.filter(pk=pk, **{field_name: name}).update(
+            **{f'{field_name}_variants': variants}
+        )
+    )
+
+
+def run_in_background(model, pk, field_name, sizes, callback):
+    try:
+        if build_image_variants(model, pk, field_name, sizes):
+            callback(pk)
+    except Exception:
+        logger.exception(
+            'Не удалось построить варианты изображения %s %s.',
+            model.__name__, pk,
+        )
+    finally:
+        connections.close_all()
+
+
+def schedule_image_variants(instance, field_name, sizes, callback):
+    """
+    Ставит построение вариантов изображения в пул после фиксации
+    транзакции, если изображение изменилось.
+
+    callback(pk) вызывается после сохранения вариантов. При
+    IMAGE_VARIANTS_WORKERS = 0 варианты строятся сразу после фиксации.
+    """
+    name = getattr(instance, field_name).name
+    variants = getattr(instance, f'{field_name}_variants')
+    if not name:
+        if variants:
+            type(instance).objects.filter(pk=instance.pk).update(
+                **{f'{field_name}_variants': {}}
+            )
+        return
+    if variants.get('source') == name:
+        return
+
+    def submit():
+        arguments = (type(instance), instance.pk, field_name, sizes, callback)
+        if settings.IMAGE_VARIANTS_WORKERS:
+            get_executor().submit(run_in_background, *arguments)
+        elif build_image_variants(*arguments[:-1]):
+            callback(instance.pk)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from foodgram.constants import AVATAR_IMAGE_VARIANTS, RECIPE_IMAGE_VARIANTS
+
+from recipes.images import build_image_variants
+from recipes.models import Recipes
+from users.models import User
+
+
+# Запуск команды: python manage.py build_image_variants [--force]
+class Command(BaseCommand):
+    help = (
+        'Строит уменьшенные варианты изображений рецептов и аватаров, '
+        'для которых они отсутствуют или устарели'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Перестроить варианты для всех изображений.',
+        )
+
+    def build(self, model, field_name, sizes, force):
+        """Строит варианты и возвращает id обработанных объектов."""
+        built = []
+        objects = model.objects.exclude(**{field_name: ''}).exclude(
+            **{f'{field_name}__isnull': True}
+        ).values_list('pk', field_name, f'{field_name}_variants')
+        for pk, name, variants in objects.iterator():
+            if not force and variants.get('source') == name:
+                continue
+            try:
+                if build_image_variants(model, pk, field_name, sizes):
+                    built.append(pk)
+            except (OSError, ValueError) as error:
+                self.stdout.write(self.style.WARNING(
+                    f'{model.__name__} {pk}: {error}'
+                ))
+        self.stdout.write(
+            f'{model._meta.verbose_name_plural}: обработано {len(built)}.'
+        )
+        return built
+
+    def handle(self, *args, **options):
+        recipe_ids = self.build(
+            Recipes, 'image', RECIPE_IMAGE_VARIANTS, options['force']
+        )
+        author_ids = self.build(
+            User, 'avatar', AVATAR_IMAGE_VARIANTS, options['force']
+        )
+        # Варианты сохраняются через update, сигналы не отправляются,
+        # поэтому закэшированные ответы сбрасываем явно.
+        if recipe_ids or author_ids:
+            Recipes.objects.filter(
+                Q(pk__in=recipe_ids) | Q(author_id__in=author_ids)
+            ).bump_version()
@@ -0,0 +1,134 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from foodgram.constants import (
+    CONTENT_STORAGE_PATH,
+    IMAGE_VARIANTS_PATH,
+    MEDIA_GC_GRACE_PERIOD
+)
+from foodgram.storage import content_storage
+
+from recipes.models import MEDIA_FIELDS, MediaFile
+
+
+def walk(storage, path):
+    """Перебирает имена всех файлов каталога хранилища рекурсивно."""
+    if not storage.exists(path):
+        return
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+# Запуск команды: python manage.py collect_media [--recount] [--dry-run]
+# [--grace 3600]
+class Command(BaseCommand):
+    help = (
+        'Удаляет медиафайлы и уменьшенные варианты изображений, '
+        'на которые не ссылается ни один объект'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Сначала пересчитать ссылки по данным в базе.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать файлы, которые будут удалены.',
+        )
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=MEDIA_GC_GRACE_PERIOD,
+            help='Не удалять файлы моложе указанного числа секунд.',
+        )
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            live = MediaFile.objects.recount()
+        else:
+            live = MediaFile.objects.live_references()
+        variants = self.get_variant_names()
+        threshold = timezone.now() - timedelta(seconds=options['grace'])
+
+        # Ссылки перепроверяются по данным в базе: объекты могли быть
+        # созданы в обход сигналов (например, bulk_create).
+        released = MediaFile.objects.filter(
+            references=0, updated_at__lt=threshold
+        ).exclude(name__in=live)
+        orphans = set(released.values_list('name', flat=True))
+        tracked = set(MediaFile.objects.values_list('name', flat=True))
+        directories = {CONTENT_STORAGE_PATH, IMAGE_VARIANTS_PATH} | {
+            model._meta.get_field(field_name).upload_to
+            for model, field_name in MEDIA_FIELDS
+        }
+        for directory in directories:
+            for name in walk(content_storage, directory.rstrip('/')):
+                if (
+                    name not in live
+                    and name not in variants
+                    and name not in tracked
+                    and content_storage.get_modified_time(name) < threshold
+                ):
+                    orphans.add(name)
+
+        for name in sorted(orphans):
+            self.stdout.write(name)
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f'Пробный запуск: к удалению {len(orphans)} файлов.'
+            ))
+            return
+        deleted = sum(
+            self.delete_orphan(name, threshold) for name in sorted(orphans)
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено файлов: {deleted}.'
+        ))
+
+    def delete_orphan(self, name, threshold):
+        """
+        Удаляет файл name, если на него по-прежнему нет ссылок.
+
+        Список кандидатов построен по снимку базы, а повторная загрузка
+        того же содержимого возвращает имя существующего файла. Поэтому
+        перед удалением ссылки перепроверяются под блокировкой строки
+        MediaFile, и файл удаляется в той же транзакции, что и строка:
+        одновременное увеличение счетчика ждет ее завершения. Для файла
+        без учета строка создается, чтобы блокировка была общей.
+        Уменьшенный вариант перепроверяется по сохраненным вариантам и
+        по содержимому текущих изображений объектов.
+        """
+        with transaction.atomic():
+            media, created = (
+                MediaFile.objects.select_for_update().get_or_create(name=name)
+            )
+            if (
+                media.references
+                or (not created and media.updated_at >= threshold)
+                or MediaFile.objects.is_referenced(name)
+            ):
+                return False
+            content_storage.delete(name)
+            media.delete()
+        return True
+
+    def get_variant_names(self):
+        """Возвращает имена всех используемых вариантов изображений."""
+        names = set()
+        for model, field_name in MEDIA_FIELDS:
+            for variants in model.objects.exclude(
+                **{f'{field_name}_variants': {}}
+            ).values_list(f'{field_name}_variants', flat=True).iterator():
+                for variant, formats in variants.items():
+                    if variant != 'source':
+                        names.update(formats.values())
+        return names
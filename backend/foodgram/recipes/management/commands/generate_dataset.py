@@ -0,0 +1,242 @@
+import io
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from foodgram.constants import DATASET_BATCH_SIZE
+from PIL import Image
+
+from recipes.models import (
+    Favorite,
+    IngredientInRecipe,
+    Ingredients,
+    MediaFile,
+    Recipes,
+    ShoppingCart,
+    ShoppingListItem,
+    Tags
+)
+from users.models import Subscribes, User
+
+WORDS = (
+    'суп', 'борщ', 'салат', 'пирог', 'каша', 'котлеты', 'рагу', 'плов',
+    'запеканка', 'омлет', 'блины', 'соус', 'курица', 'говядина', 'рыба',
+    'картофель', 'капуста', 'грибы', 'сыр', 'томаты', 'овощи', 'рис',
+    'гречка', 'яблоки', 'творог', 'печенье', 'пряный', 'домашний',
+    'быстрый', 'праздничный', 'летний', 'сытный',
+)
+
+
+# Запуск команды: python manage.py generate_dataset --users 1000
+# --recipes 20000 [--tags 10 --tags-per-recipe 3] [--prefix bench]
+# [--seed 1] [--clear]
+class Command(BaseCommand):
+    help = (
+        'Создает синтетический набор данных заданного размера '
+        'для нагрузочного тестирования'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument(
+            '--tags-per-recipe', type=int, default=3,
+            help='Наибольшее количество тегов у рецепта: каждому рецепту '
+                 'достается от 1 до стольких случайных тегов.',
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=1000,
+            help='Сколько ингредиентов создать, если справочник пуст.',
+        )
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Количество избранных рецептов у каждого пользователя.',
+        )
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Количество рецептов в корзине каждого пользователя.',
+        )
+        parser.add_argument(
+            '--subscriptions', type=int, default=10,
+            help='Количество подписок каждого пользователя.',
+        )
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Префикс юзернеймов и email синтетических пользователей.',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=1,
+            help='Начальное значение генератора для воспроизводимости.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DATASET_BATCH_SIZE,
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Удалить ранее созданных пользователей с этим префиксом '
+                 'и их рецепты.',
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+
+        if options['clear']:
+            deleted, _ = User.objects.filter(
+                username__startswith=prefix
+            ).delete()
+            self.stdout.write(f'Удалено объектов: {deleted}.')
+
+        with transaction.atomic():
+            users = self.create_users(prefix, options['users'])
+            tags = self.get_tags(options['tags'])
+            ingredients = self.get_ingredients(options['ingredients'])
+            recipes = self.create_recipes(
+                prefix, users, tags, ingredients, options
+            )
+            self.create_relations(
+                Favorite, users, recipes, options['favorites'],
+                lambda user, recipe: Favorite(user=user, recipe=recipe),
+            )
+            self.create_relations(
+                ShoppingCart, users, recipes, options['carts'],
+                lambda user, recipe: ShoppingCart(user=user, recipe=recipe),
+            )
+            self.create_relations(
+                Subscribes, users, users, options['subscriptions'],
+                lambda user, author: Subscribes(user=user, author=author),
+            )
+            Recipes.objects.filter(
+                pk__in=[recipe.pk for recipe in recipes]
+            ).update_search_vector()
+            ShoppingListItem.objects.rebuild()
+            if recipes:
+                MediaFile.objects.change_references(
+                    {recipes[0].image.name: len(recipes)}
+                )
+        call_command('recount_counters', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(users)}, '
+            f'рецептов: {len(recipes)}.'
+        ))
+
+    def create_users(self, prefix, count):
+        start = User.objects.filter(username__startswith=prefix).count()
+        password = make_password(f'{prefix}-password')
+        return User.objects.bulk_create(
+            (
+                User(
+                    username=f'{prefix}{number}',
+                    email=f'{prefix}{number}@example.com',
+                    first_name=self.random.choice(WORDS).capitalize(),
+                    last_name=self.random.choice(WORDS).capitalize(),
+                    password=password,
+                )
+                for number in range(start, start + count)
+            ),
+            batch_size=self.batch_size,
+        )
+
+    def get_tags(self, count):
+        tags = list(Tags.objects.all())
+        tags += Tags.objects.bulk_create(
+            Tags(name=f'Тег {number}', slug=f'tag-{number}')
+            for number in range(len(tags), count)
+        )
+        return tags
+
+    def get_ingredients(self, count):
+        ingredients = list(Ingredients.objects.values_list('pk', flat=True))
+        if ingredients:
+            return ingredients
+        return [
+            ingredient.pk for ingredient in Ingredients.objects.bulk_create(
+                (
+                    Ingredients(
+                        name=f'{self.random.choice(WORDS)} {number}',
+                        measurement_unit=self.random.choice(('г', 'шт')),
+                    )
+                    for number in range(count)
+                ),
+                batch_size=self.batch_size,
+            )
+        ]
+
+    def get_image(self, prefix):
+        """Сохраняет одно изображение, общее для всех рецептов."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (300, 300), 'orange').save(buffer, 'JPEG')
+        return Recipes.image.field.storage.save(
+            f'{Recipes.image.field.upload_to}{prefix}.jpg',
+            ContentFile(buffer.getvalue()),
+        )
+
+    def create_recipes(self, prefix, users, tags, ingredients, options):
+        if not users:
+            return []
+        image = self.get_image(prefix)
+        recipes = Recipes.objects.bulk_create(
+            (
+                Recipes(
+                    name=' '.join(
+                        self.random.sample(WORDS, 3)
+                    ).capitalize(),
+                    text=' '.join(self.random.choices(WORDS, k=40)),
+                    cooking_time=self.random.randint(5, 180),
+                    image=image,
+                    author=self.random.choice(users),
+                )
+                for _ in range(options['recipes'])
+            ),
+            batch_size=self.batch_size,
+        )
+        recipe_tags = Recipes.tags.through
+        tags_per_recipe = min(len(tags), options['tags_per_recipe'])
+        recipe_tags.objects.bulk_create(
+            (
+                recipe_tags(recipes_id=recipe.pk, tags_id=tag.pk)
+                for recipe in recipes
+                for tag in self.random.sample(
+                    tags, self.random.randint(min(1, tags_per_recipe),
+                                              tags_per_recipe)
+                )
+            ),
+            batch_size=self.batch_size,
+        )
+        per_recipe = min(len(ingredients), options['ingredients_per_recipe'])
+        IngredientInRecipe.objects.bulk_create(
+            (
+                IngredientInRecipe(
+                    recipe_id=recipe.pk,
+                    ingredient_id=ingredient_id,
+                    amount=self.random.randint(1, 500),
+                )
+                for recipe in recipes
+                for ingredient_id in self.random.sample(
+                    ingredients, per_recipe
+                )
+            ),
+            batch_size=self.batch_size,
+        )
+        return recipes
+
+    def create_relations(self, model, users, targets, count, factory):
+        """Создает связи каждого пользователя со случайными объектами."""
+        count = min(count, len(targets))
+        model.objects.bulk_create(
+            (
+                factory(user, target)
+                for user in users
+                for target in self.random.sample(targets, count)
+                if target != user
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
@@ -1,37 +1,127 @@
 import csv
+import json
 import os
+import time
+from itertools import islice
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from foodgram.constants import (
+    INGREDIENTS_BATCH_SIZE,
+    MAX_LENGTH_INGREDIENT_NAME,
+    MAX_LENGTH_MEASUREMENT_UNIT
+)
 
-from recipes.models import Ingredients
+from recipes.models import DataVersion, Ingredients
 
 
-# Запуск команды: python manage.py load_csv
+# Запуск команды: python manage.py load_csv [--path ...] [--batch-size ...]
 class Command(BaseCommand):
-    help = 'Импортирует данные из CSV-файла для модели Ingredients'
+    help = (
+        'Импортирует ингредиенты из CSV- или JSON-файла пачками. '
+        'Повторный запуск не создает дубликатов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv'),
+            help='Путь к файлу .csv (name,measurement_unit) или .json.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=INGREDIENTS_BATCH_SIZE,
+            help='Количество строк в одной транзакции.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Прочитать и проверить файл без записи в базу.',
+        )
+
+    def read_csv(self, file):
+        for row in csv.reader(file):
+            if len(row) == 2:
+                yield row
+            else:
+                self.skipped += 1
+
+    def read_json(self, file):
+        for item in json.load(file):
+            yield item.get('name'), item.get('measurement_unit')
+
+    def read_rows(self, file, extension):
+        """Читает файл построчно и отбрасывает некорректные строки."""
+        reader = self.read_json if extension == '.json' else self.read_csv
+        for name, measurement_unit in reader(file):
+            name = (name or '').strip()
+            measurement_unit = (measurement_unit or '').strip()
+            if (
+                not name or not measurement_unit
+                or len(name) > MAX_LENGTH_INGREDIENT_NAME
+                or len(measurement_unit) > MAX_LENGTH_MEASUREMENT_UNIT
+            ):
+                self.skipped += 1
+                continue
+            yield name, measurement_unit
+
+    def save_batch(self, batch):
+        """
+        Сохраняет пачку строк одним INSERT ... ON CONFLICT DO NOTHING.
+
+        Строка справочника целиком совпадает с ключом уникальности
+        (name, measurement_unit), поэтому существующие строки не
+        перезаписываются.
+        """
+        with transaction.atomic():
+            Ingredients.objects.bulk_create(
+                [
+                    Ingredients(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in batch
+                ],
+                ignore_conflicts=True,
+            )
 
     def handle(self, *args, **options):
-        file_path = os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv')
+        file_path = options['path']
+        batch_size = options['batch_size']
         if not os.path.exists(file_path):
-            self.stderr.write(self.style.ERROR(f'Файл {file_path} не найден.'))
-            return
+            raise CommandError(f'Файл {file_path} не найден.')
+        if batch_size < 1:
+            raise CommandError('Размер пачки должен быть положительным.')
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension not in ('.csv', '.json'):
+            raise CommandError('Поддерживаются только файлы .csv и .json.')
 
+        self.skipped = 0
         count = 0
-        with open(file_path, encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            for row in reader:
-                print(row)
-                obj, created = Ingredients.objects.update_or_create(
-                    name=row[0],
-                    measurement_unit=row[1]
-                )
-                count += 1
-                if created:
-                    self.stdout.write(
-                        self.style.SUCCESS(f'Создан объект: {obj}'))
-                else:
-                    self.stdout.write(
-                        self.style.WARNING(f'Обновлен объект: {obj}'))
+        count_before = Ingredients.objects.count()
+        started = time.monotonic()
+        with open(file_path, encoding='utf-8') as file:
+            rows = self.read_rows(file, extension)
+            while batch := set(islice(rows, batch_size)):
+                if not options['dry_run']:
+                    self.save_batch(batch)
+                count += len(batch)
+        elapsed = time.monotonic() - started
+
+        rate = count / elapsed if elapsed else count
+        self.stdout.write(
+            f'Обработано {count} записей за {elapsed:.2f} с '
+            f'({rate:.0f} строк/с), пропущено {self.skipped}.'
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                'Пробный запуск: изменения не сохранены.'
+            ))
+            return
+        created = Ingredients.objects.count() - count_before
+        # bulk_create не отправляет сигналы, версию справочника
+        # увеличиваем явно, чтобы сбросить кэш.
+        if created:
+            DataVersion.objects.bump('ingredients')
         self.stdout.write(
-            self.style.SUCCESS(f'Импортировано {count} записей.'))
+            self.style.SUCCESS(f'Импортировано {count} записей, '
+                               f'новых {created}.'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import ShoppingListItem
+
+
+# Запуск команды: python manage.py rebuild_shopping_lists [--check]
+class Command(BaseCommand):
+    help = (
+        'Сверяет агрегированные списки покупок с корзинами пользователей '
+        'и пересобирает их'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить списки, не пересобирая их.',
+        )
+
+    def handle(self, *args, **options):
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in ShoppingListItem.objects
+            .values_list('user_id', 'ingredient_id', 'amount')
+            .iterator()
+        }
+        live = {
+            (row['user_id'], row['ingredient_id']): row['total']
+            for row in ShoppingListItem.objects.live_totals().iterator()
+        }
+        mismatches = [
+            key for key in stored.keys() | live.keys()
+            if stored.get(key) != live.get(key)
+        ]
+        for user_id, ingredient_id in mismatches:
+            self.stdout.write(self.style.WARNING(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'в списке {stored.get((user_id, ingredient_id), 0)}, '
+                f'в корзине {live.get((user_id, ingredient_id), 0)}.'
+            ))
+        self.stdout.write(f'Расхождений: {len(mismatches)}.')
+
+        if options['check']:
+            return
+        ShoppingListItem.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересобраны: {len(live)} позиций.'
+        ))
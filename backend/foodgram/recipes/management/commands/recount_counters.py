@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipes, ShoppingCart
+from users.models import Subscribes, User
+
+
+def count_related(model, field):
+    """Подзапрос с количеством строк model, ссылающихся на объект."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .values(field).annotate(total=Count('pk')).values('total')
+        ),
+        Value(0),
+    )
+
+
+# Запуск команды: python manage.py recount_counters [--check]
+class Command(BaseCommand):
+    help = (
+        'Сверяет счетчики избранного, списков покупок и подписчиков '
+        'с фактическими данными и исправляет расхождения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить счетчики, не исправляя их.',
+        )
+
+    def reconcile(self, queryset, counters, check):
+        """
+        Находит объекты с неверными счетчиками и пересчитывает их.
+
+        - counters: словарь {поле счетчика: выражение с фактическим
+        значением}.
+        """
+        queryset = queryset.annotate(
+            **{f'actual_{field}': value for field, value in counters.items()}
+        ).filter(
+            Q(*(
+                ~Q(**{field: F(f'actual_{field}')}) for field in counters
+            ), _connector=Q.OR)
+        )
+        drifted = list(queryset.values_list('pk', flat=True))
+        model_name = queryset.model._meta.verbose_name_plural
+        self.stdout.write(f'{model_name}: расхождений {len(drifted)}.')
+        if drifted and not check:
+            queryset.model.objects.filter(pk__in=drifted).update(**counters)
+        return len(drifted)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = self.reconcile(
+                Recipes.objects.all(),
+                {
+                    'favorites_count': count_related(Favorite, 'recipe'),
+                    'in_carts_count': count_related(ShoppingCart, 'recipe'),
+                },
+                options['check'],
+            ) + self.reconcile(
+                User.objects.all(),
+                {'subscribers_count': count_related(Subscribes, 'author')},
+                options['check'],
+            )
+        if drifted and not options['check']:
+            self.stdout.write(self.style.SUCCESS('Счетчики исправлены.'))
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:19
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_recipe_users(apps, schema_editor):
+    Recipes = apps.get_model('recipes', 'Recipes')
+    counters = {
+        'favorites_count': apps.get_model('recipes', 'Favorite'),
+        'in_carts_count': apps.get_model('recipes', 'ShoppingCart'),
+    }
+    Recipes.objects.update(**{
+        field: Coalesce(
+            Subquery(
+                model.objects.filter(recipe=OuterRef('pk'))
+                .values('recipe').annotate(total=Count('pk')).values('total')
+            ),
+            Value(0),
+        )
+        for field, model in counters.items()
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_dataversion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='добавлений в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipes',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='добавлений в список покупок'),
+        ),
+        migrations.AddIndex(
+            model_name='recipes',
+            index=models.Index(fields=['-favorites_count', 'id'], name='recipe_favorites_count_idx'),
+        ),
+        migrations.RunPython(count_recipe_users, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:33
+
+import foodgram.storage
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_media_files(apps, schema_editor):
+    MediaFile = apps.get_model('recipes', 'MediaFile')
+    references = {}
+    for model, field_name in (
+        (apps.get_model('recipes', 'Recipes'), 'image'),
+        (apps.get_model(settings.AUTH_USER_MODEL), 'avatar'),
+    ):
+        rows = model.objects.exclude(**{field_name: ''}).exclude(
+            **{f'{field_name}__isnull': True}
+        ).values_list(field_name).annotate(total=Count('pk')).order_by()
+        for name, total in rows.iterator():
+            references[name] = references.get(name, 0) + total
+    MediaFile.objects.bulk_create(
+        MediaFile(name=name, references=total)
+        for name, total in references.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='имя файла')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='количество ссылок')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='изменен')),
+            ],
+            options={
+                'verbose_name': 'медиафайл',
+                'verbose_name_plural': 'медиафайлы',
+            },
+        ),
+        migrations.AlterField(
+            model_name='recipes',
+            name='image',
+            field=models.ImageField(storage=foodgram.storage.get_content_storage, upload_to='media/recipes/images/', verbose_name='изображение рецепта'),
+        ),
+        migrations.RunPython(fill_media_files, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,38 @@
-from django.core.validators import MinValueValidator
-from django.db import models
+import posixpath
 
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.core.validators import MinValueValidator
+from django.db import models, transaction
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When
+)
+from django.db.models.functions import Coalesce, Greatest, Upper
+from django.utils import timezone
 from foodgram.constants import (
+    IMAGE_VARIANT_FORMATS,
+    IMAGE_VARIANTS_PATH,
+    MAX_LENGTH_DATA_VERSION_NAME,
     MAX_LENGTH_INGREDIENT_NAME,
     MAX_LENGTH_MEASUREMENT_UNIT,
+    MAX_LENGTH_MEDIA_FILE_NAME,
     MAX_LENGTH_RECIPE_NAME,
     MAX_LENGTH_TAG_NAME,
     MAX_LENGTH_TAG_SLUG,
-    MIN_VALUE_COOKING_TIME
+    MIN_VALUE_COOKING_TIME,
+    SEARCH_CONFIG
 )
+from foodgram.storage import get_content_storage
+
 from users.models import User
 
 
@@ -37,6 +61,18 @@ class Ingredients(models.Model):
                 name='unique_name_measurement_unit'
             )
         ]
+        # Индексы для подсказок по названию: B-tree для поиска по началу
+        # строки и триграммный GIN для поиска по подстроке.
+        indexes = [
+            models.Index(
+                OpClass(Upper('name'), name='text_pattern_ops'),
+                name='ingredient_name_prefix_idx',
+            ),
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                name='ingredient_name_trgm_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -68,6 +104,43 @@ class Tags(models.Model):
         return self.name
 
 
+class RecipesQuerySet(models.QuerySet):
+
+    def update_search_vector(self):
+        """
+        Пересчитывает поисковый вектор рецептов по названию (вес A),
+        описанию (вес B) и названиям ингредиентов (вес C).
+        """
+        ingredient_names = IngredientInRecipe.objects.filter(
+            recipe=OuterRef('pk')
+        ).values('recipe').annotate(
+            names=StringAgg('ingredient__name', delimiter=' ')
+        ).values('names')
+        return self.update(
+            search_vector=(
+                SearchVector('name', weight='A', config=SEARCH_CONFIG)
+                + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+                + SearchVector(
+                    Coalesce(
+                        Subquery(ingredient_names),
+                        Value(''),
+                        output_field=models.TextField(),
+                    ),
+                    weight='C',
+                    config=SEARCH_CONFIG,
+                )
+            )
+        )
+
+    def bump_version(self):
+        """
+        Увеличивает версии рецептов и поколение списков рецептов,
+        по которым кэшируются ответы API.
+        """
+        self.update(version=F('version') + 1)
+        DataVersion.objects.bump('recipes')
+
+
 class Recipes(models.Model):
     """
     Модель для хранения рецептов.
@@ -85,7 +158,14 @@ class Recipes(models.Model):
     )
     image = models.ImageField(
         'изображение рецепта',
-        upload_to='media/recipes/images/'
+        upload_to='media/recipes/images/',
+        storage=get_content_storage
+    )
+    image_variants = models.JSONField(
+        'уменьшенные варианты изображения',
+        default=dict,
+        blank=True,
+        editable=False
     )
     text = models.TextField(
         'описание рецепта'
@@ -111,11 +191,45 @@ class Recipes(models.Model):
         verbose_name='теги',
         related_name='recipes',
     )
+    favorites_count = models.PositiveIntegerField(
+        'добавлений в избранное',
+        default=0
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'добавлений в список покупок',
+        default=0
+    )
+    search_vector = SearchVectorField(
+        'поисковый вектор',
+        null=True,
+        editable=False
+    )
+    version = models.PositiveIntegerField(
+        'версия',
+        default=1,
+        editable=False
+    )
+
+    objects = RecipesQuerySet.as_manager()
 
     class Meta:
         ordering = ['id']
         verbose_name = 'рецепт'
         verbose_name_plural = 'рецепты'
+        indexes = [
+            models.Index(
+                fields=['-favorites_count', 'id'],
+                name='recipe_favorites_count_idx',
+            ),
+            models.Index(
+                fields=['author', 'id'],
+                name='recipe_author_id_idx',
+            ),
+            GinIndex(
+                fields=['search_vector'],
+                name='recipe_search_vector_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -182,6 +296,14 @@ class UserRecipe(models.Model):
                 name='%(app_label)s_%(class)s_unique'
             )
         ]
+        # Индекс для поиска пользователей по рецепту (счетчики, фильтры
+        # is_favorited/is_in_shopping_cart с исключением).
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='%(class)s_recipe_user_idx'
+            )
+        ]
 
 
 class Favorite(UserRecipe):
@@ -190,6 +312,9 @@ class Favorite(UserRecipe):
 
     Связана с моделью MyUser (ForeignKey), Recipes (ForeignKey).
     """
+    # Счетчик модели Recipes, который отражает количество записей.
+    counter_field = 'favorites_count'
+
     class Meta(UserRecipe.Meta):
         verbose_name = 'избранный рецепт'
         verbose_name_plural = 'избранные рецепты'
@@ -205,6 +330,9 @@ class ShoppingCart(UserRecipe):
 
     Связана с моделью MyUser (ForeignKey), Recipes (ForeignKey).
     """
+    # Счетчик модели Recipes, который отражает количество записей.
+    counter_field = 'in_carts_count'
+
     class Meta(UserRecipe.Meta):
         verbose_name = 'список покупок'
         verbose_name_plural = 'списки покупок'
@@ -212,3 +340,312 @@ class ShoppingCart(UserRecipe):
 
     def __str__(self):
         return f'{self.user.username}: в списке покупок: {self.recipe.name}'
+
+
+class ShoppingListManager(models.Manager):
+    """
+    Менеджер для поддержания агрегированного списка покупок.
+
+    Суммы ингредиентов обновляются инкрементально при изменении корзины
+    и рецептов, поэтому выгрузка списка читает готовые строки.
+    """
+
+    def live_totals(self, user_ids=None):
+        """
+        Считает список покупок напрямую по рецептам в корзинах.
+
+        Условия на корзину передаются в один filter(): отдельный вызов
+        для многозначной связи добавил бы второй JOIN корзин.
+        """
+        conditions = {'recipe__in_shopping_cart__isnull': False}
+        if user_ids is not None:
+            conditions['recipe__in_shopping_cart__user__in'] = user_ids
+        return IngredientInRecipe.objects.filter(**conditions).values(
+            'ingredient_id', user_id=F('recipe__in_shopping_cart__user')
+        ).annotate(total=Sum('amount')).order_by()
+
+    def add_amounts(self, user_ids, amounts):
+        """
+        Прибавляет к спискам пользователей количества ингредиентов.
+
+        - user_ids: id пользователей, списки которых нужно изменить.
+        - amounts: словарь {id ингредиента: изменение количества},
+        отрицательные значения вычитаются.
+        """
+        amounts = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items() if amount
+        }
+        user_ids = list(user_ids)
+        if not user_ids or not amounts:
+            return
+        with transaction.atomic():
+            self.bulk_create(
+                [
+                    self.model(
+                        user_id=user_id, ingredient_id=ingredient_id, amount=0
+                    )
+                    for user_id in user_ids
+                    for ingredient_id, amount in amounts.items() if amount > 0
+                ],
+                ignore_conflicts=True,
+            )
+            items = self.filter(
+                user_id__in=user_ids, ingredient_id__in=amounts
+            )
+            items.update(
+                amount=Greatest(
+                    F('amount') + Case(
+                        *(
+                            When(
+                                ingredient_id=ingredient_id, then=Value(amount)
+                            )
+                            for ingredient_id, amount in amounts.items()
+                        ),
+                        default=Value(0),
+                    ),
+                    Value(0),
+                )
+            )
+            items.filter(amount=0).delete()
+
+    def add_recipe(self, recipe, user_ids, sign=1):
+        """Добавляет ингредиенты рецепта в списки пользователей."""
+        self.add_amounts(
+            user_ids,
+            {
+                ingredient_id: sign * amount
+                for ingredient_id, amount in recipe.ingredients_in_recipe
+                .values_list('ingredient_id', 'amount')
+            },
+        )
+
+    def remove_recipe(self, recipe, user_ids):
+        """Вычитает ингредиенты рецепта из списков пользователей."""
+        self.add_recipe(recipe, user_ids, sign=-1)
+
+    def rebuild(self):
+        """Полностью пересобирает списки покупок по корзинам."""
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(
+                self.model(
+                    user_id=row['user_id'],
+                    ingredient_id=row['ingredient_id'],
+                    amount=row['total'],
+                )
+                for row in self.live_totals().iterator()
+            )
+
+
+class ShoppingListItem(models.Model):
+    """
+    Модель для хранения агрегированного списка покупок.
+
+    Хранит суммарное количество каждого ингредиента по всем рецептам
+    в корзине пользователя.
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name='пользователь',
+        related_name='shopping_list',
+        on_delete=models.CASCADE
+    )
+    ingredient = models.ForeignKey(
+        Ingredients,
+        verbose_name='ингредиент',
+        related_name='shopping_list_items',
+        on_delete=models.CASCADE
+    )
+    amount = models.PositiveIntegerField('количество ингредиента')
+
+    objects = ShoppingListManager()
+
+    class Meta:
+        verbose_name = 'позиция списка покупок'
+        verbose_name_plural = 'позиции списка покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user.username}: {self.ingredient.name} {self.amount}'
+
+
+class DataVersionManager(models.Manager):
+    """Менеджер для чтения и увеличения версий данных."""
+
+    def get_version(self, name):
+        """Возвращает текущую версию набора данных."""
+        return self.filter(name=name).values_list(
+            'version', flat=True
+        ).first() or 0
+
+    async def aget_version(self, name):
+        """Асинхронный вариант get_version."""
+        return await self.filter(name=name).values_list(
+            'version', flat=True
+        ).afirst() or 0
+
+    def bump(self, *names):
+        """Увеличивает версии наборов данных на единицу."""
+        self.bulk_create(
+            [self.model(name=name) for name in names], ignore_conflicts=True
+        )
+        self.filter(name__in=names).update(version=F('version') + 1)
+
+
+class DataVersion(models.Model):
+    """
+    Модель для хранения версий редко изменяемых данных.
+
+    Версия увеличивается при каждом изменении набора данных (например,
+    тегов или ингредиентов) и используется как часть ключа кэша и ETag,
+    поэтому все процессы приложения видят изменения сразу.
+    """
+    name = models.CharField(
+        'набор данных',
+        max_length=MAX_LENGTH_DATA_VERSION_NAME,
+        primary_key=True
+    )
+    version = models.PositiveBigIntegerField('версия', default=0)
+
+    objects = DataVersionManager()
+
+    class Meta:
+        verbose_name = 'версия данных'
+        verbose_name_plural = 'версии данных'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
+
+
+class MediaFileManager(models.Manager):
+    """Менеджер для учета ссылок на медиафайлы."""
+
+    def change_references(self, changes):
+        """
+        Изменяет счетчики ссылок на файлы.
+
+        - changes: словарь {имя файла: изменение количества ссылок}.
+        """
+        changes = {name: delta for name, delta in changes.items()
+                   if name and delta}
+        if not changes:
+            return
+        self.bulk_create(
+            [self.model(name=name) for name in changes], ignore_conflicts=True
+        )
+        for name, delta in changes.items():
+            self.filter(name=name).update(
+                references=Greatest(F('references') + delta, 0),
+                updated_at=timezone.now(),
+            )
+
+    def live_references(self):
+        """
+        Считает фактические ссылки на файлы во всех полях MEDIA_FIELDS.
+
+        Возвращает словарь {имя файла: количество ссылок}.
+        """
+        references = {}
+        for model, field_name in MEDIA_FIELDS:
+            rows = model.objects.exclude(**{field_name: ''}).exclude(
+                **{f'{field_name}__isnull': True}
+            ).values_list(field_name).annotate(total=Count('pk')).order_by()
+            for name, total in rows.iterator():
+                references[name] = references.get(name, 0) + total
+        return references
+
+    def is_referenced(self, name):
+        """
+        Проверяет, ссылается ли на файл name объект в MEDIA_FIELDS.
+
+        Уменьшенный вариант изображения используется, если его имя
+        сохранено в {поле}_variants объекта или объект ссылается на
+        изображение с тем же содержимым: его варианты могут еще строиться
+        или быть пропущены при построении как уже существующие.
+        """
+        return any(
+            model.objects.filter(
+                self.get_reference_condition(field_name, name)
+            ).exists()
+            for model, field_name in MEDIA_FIELDS
+        )
+
+    def get_reference_condition(self, field_name, name):
+        """Условие на объекты, поле field_name которых ссылается на name."""
+        if not name.startswith(IMAGE_VARIANTS_PATH):
+            return Q(**{field_name: name})
+        # Имя варианта: {хэш содержимого}-{вариант}.{расширение}, а имя
+        # исходного файла в ContentAddressedStorage содержит тот же хэш.
+        digest, _, rest = posixpath.basename(name).partition('-')
+        variant, _, extension = rest.rpartition('.')
+        condition = Q(**{f'{field_name}__contains': digest})
+        for image_format, (format_extension, _) in (
+            IMAGE_VARIANT_FORMATS.items()
+        ):
+            if format_extension == extension:
+                condition |= Q(**{
+                    f'{field_name}_variants__{variant}__{image_format}': name
+                })
+        return condition
+
+    def recount(self):
+        """Приводит счетчики ссылок к фактическим значениям."""
+        live = self.live_references()
+        now = timezone.now()
+        with transaction.atomic():
+            stored = dict(self.values_list('name', 'references'))
+            self.bulk_create(
+                [
+                    self.model(name=name, references=total)
+                    for name, total in live.items() if name not in stored
+                ],
+                ignore_conflicts=True,
+            )
+            self.bulk_update(
+                [
+                    self.model(
+                        name=name, references=live.get(name, 0),
+                        updated_at=now,
+                    )
+                    for name, references in stored.items()
+                    if references != live.get(name, 0)
+                ],
+                ['references', 'updated_at'],
+            )
+        return live
+
+
+class MediaFile(models.Model):
+    """
+    Модель для учета ссылок на загруженные медиафайлы.
+
+    Одинаковые файлы хранятся один раз (ContentAddressedStorage), поэтому
+    файл можно удалить, только когда на него не ссылается ни один объект.
+    Файлы без ссылок удаляет команда collect_media.
+    """
+    name = models.CharField(
+        'имя файла',
+        max_length=MAX_LENGTH_MEDIA_FILE_NAME,
+        primary_key=True
+    )
+    references = models.PositiveIntegerField('количество ссылок', default=0)
+    updated_at = models.DateTimeField('изменен', auto_now=True)
+
+    objects = MediaFileManager()
+
+    class Meta:
+        verbose_name = 'медиафайл'
+        verbose_name_plural = 'медиафайлы'
+
+    def __str__(self):
+        return f'{self.name}: {self.references}'
+
+
+# Поля моделей, ссылки которых учитываются в MediaFile.
+MEDIA_FIELDS = ((Recipes, 'image'), (User, 'avatar'))
@@ -0,0 +1,159 @@
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save
+)
+from django.dispatch import receiver
+from foodgram.constants import AVATAR_IMAGE_VARIANTS, RECIPE_IMAGE_VARIANTS
+
+from recipes.images import schedule_image_variants
+from recipes.models import (
+    MEDIA_FIELDS,
+    DataVersion,
+    Ingredients,
+    MediaFile,
+    Recipes,
+    Tags
+)
+from users.models import User
+
+# Поля автора, которые входят в ответы API с рецептами.
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name', 'avatar'}
+
+
+@receiver((post_save, post_delete), sender=Tags)
+def bump_tags_version(sender, **kwargs):
+    """Увеличивает версию тегов при их изменении."""
+    DataVersion.objects.bump('tags')
+
+
+@receiver((post_save, post_delete), sender=Ingredients)
+def bump_ingredients_version(sender, **kwargs):
+    """Увеличивает версию ингредиентов при их изменении."""
+    DataVersion.objects.bump('ingredients')
+
+
+@receiver(post_save, sender=Ingredients)
+def update_recipes_search_vector(sender, instance, created, **kwargs):
+    """Обновляет поисковый вектор рецептов при изменении ингредиента."""
+    if not created:
+        Recipes.objects.filter(
+            ingredients_in_recipe__ingredient=instance
+        ).update_search_vector()
+
+
+@receiver(post_save, sender=Recipes)
+def bump_recipe_version(sender, instance, **kwargs):
+    """
+    Увеличивает версию рецепта и поколение списков при его сохранении.
+
+    Теги и ингредиенты рецепта меняются в той же транзакции, что и
+    сохранение рецепта, поэтому новая версия становится видна вместе
+    с ними.
+    """
+    Recipes.objects.filter(pk=instance.pk).bump_version()
+
+
+@receiver(post_delete, sender=Recipes)
+def bump_recipes_list_version(sender, **kwargs):
+    """Увеличивает поколение списков рецептов при удалении рецепта."""
+    DataVersion.objects.bump('recipes')
+
+
+@receiver((post_save, pre_delete), sender=Tags)
+def bump_tag_recipes_version(sender, instance, created=False, **kwargs):
+    """Увеличивает версии рецептов с измененным или удаляемым тегом."""
+    if not created:
+        Recipes.objects.filter(tags=instance).bump_version()
+
+
+@receiver((post_save, pre_delete), sender=Ingredients)
+def bump_ingredient_recipes_version(sender, instance, created=False,
+                                    **kwargs):
+    """
+    Увеличивает версии рецептов с измененным или удаляемым ингредиентом.
+    """
+    if not created:
+        Recipes.objects.filter(
+            ingredients_in_recipe__ingredient=instance
+        ).bump_version()
+
+
+@receiver(post_save, sender=User)
+def bump_author_recipes_version(sender, instance, created, update_fields,
+                                **kwargs):
+    """
+    Увеличивает версии рецептов автора при изменении его профиля.
+
+    Сохранения, не затрагивающие поля автора в ответах (например,
+    last_login при входе), пропускаются.
+    """
+    if created or (update_fields and not AUTHOR_FIELDS & update_fields):
+        return
+    Recipes.objects.filter(author=instance).bump_version()
+
+
+def bump_recipe_image_version(pk):
+    Recipes.objects.filter(pk=pk).bump_version()
+
+
+def bump_author_avatar_version(pk):
+    Recipes.objects.filter(author_id=pk).bump_version()
+
+
+@receiver(post_save, sender=Recipes)
+def build_recipe_image_variants(sender, instance, **kwargs):
+    """Строит уменьшенные варианты нового изображения рецепта."""
+    schedule_image_variants(
+        instance, 'image', RECIPE_IMAGE_VARIANTS, bump_recipe_image_version
+    )
+
+
+@receiver(post_save, sender=User)
+def build_avatar_variants(sender, instance, **kwargs):
+    """Строит уменьшенные варианты нового аватара."""
+    schedule_image_variants(
+        instance, 'avatar', AVATAR_IMAGE_VARIANTS, bump_author_avatar_version
+    )
+
+
+def get_media_field(sender):
+    """Возвращает имя поля с файлом модели из MEDIA_FIELDS."""
+    return dict(MEDIA_FIELDS)[sender]
+
+
+@receiver(pre_save, sender=Recipes)
+@receiver(pre_save, sender=User)
+def remember_media_file(sender, instance, update_fields=None, **kwargs):
+    """Запоминает прежнее имя файла перед сохранением объекта."""
+    field_name = get_media_field(sender)
+    if update_fields is not None and field_name not in update_fields:
+        return
+    instance._previous_media_file = (
+        sender.objects.filter(pk=instance.pk).values_list(
+            field_name, flat=True
+        ).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Recipes)
+@receiver(post_save, sender=User)
+def update_media_references(sender, instance, **kwargs):
+    """Переносит ссылку со старого файла на новый при его замене."""
+    if not hasattr(instance, '_previous_media_file'):
+        return
+    previous = instance._previous_media_file
+    del instance._previous_media_file
+    current = getattr(instance, get_media_field(sender)).name
+    if previous != current:
+        MediaFile.objects.change_references({current: 1, previous: -1})
+
+
+@receiver(post_delete, sender=Recipes)
+@receiver(post_delete, sender=User)
+def release_media_reference(sender, instance, **kwargs):
+    """Освобождает ссылку на файл удаленного объекта."""
+    MediaFile.objects.change_references(
+        {getattr(instance, get_media_field(sender)).name: -1}
+    )
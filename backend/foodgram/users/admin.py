@@ -10,6 +10,7 @@ class CustomUserAdmin(UserAdmin):
         (None, {'fields': ('email', 'username', 'password',
                            'first_name', 'last_name')}),
     )
-    list_display = ('username', 'id', 'email', 'first_name', 'last_name',)
+    list_display = ('username', 'id', 'email', 'first_name', 'last_name',
+                    'subscribers_count')
     search_fields = ('email', 'username')
     list_filter = ('email', 'username')
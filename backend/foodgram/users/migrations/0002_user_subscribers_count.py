@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:19
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_subscribers(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Subscribes = apps.get_model('users', 'Subscribes')
+    User.objects.update(subscribers_count=Coalesce(
+        Subquery(
+            Subscribes.objects.filter(author=OuterRef('pk'))
+            .values('author').annotate(total=Count('pk')).values('total')
+        ),
+        Value(0),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='количество подписчиков'),
+        ),
+        migrations.RunPython(count_subscribers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_subscribers_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscribes',
+            index=models.Index(fields=['author', 'user'], name='subscribes_author_user_idx'),
+        ),
+    ]
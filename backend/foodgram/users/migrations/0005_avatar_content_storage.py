@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:33
+
+import foodgram.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_avatar_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=foodgram.storage.get_content_storage, upload_to='media/users/', verbose_name='аватар'),
+        ),
+    ]
@@ -1,13 +1,13 @@
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.db import models
-
 from foodgram.constants import (
     MAX_LENGTH_EMAIL,
     MAX_LENGTH_FIRSTNAME,
     MAX_LENGTH_SECONDNAME,
     MAX_LENGTH_USERNAME
 )
+from foodgram.storage import get_content_storage
 
 
 class User(AbstractUser):
@@ -39,9 +39,20 @@ class User(AbstractUser):
     avatar = models.ImageField(
         'аватар',
         upload_to='media/users/',
+        storage=get_content_storage,
         null=True,
         blank=True
     )
+    avatar_variants = models.JSONField(
+        'уменьшенные варианты аватара',
+        default=dict,
+        blank=True,
+        editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        'количество подписчиков',
+        default=0
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
@@ -91,6 +102,13 @@ class Subscribes(models.Model):
                 name='prevent_self_follow'
             )
         )
+        # Индекс для поиска подписчиков автора.
+        indexes = (
+            models.Index(
+                fields=('author', 'user'),
+                name='subscribes_author_user_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.user} подписался на {self.author}'